@@ -0,0 +1,151 @@
+from dataclasses import dataclass
+from datetime import datetime
+import json
+from logging import Logger
+from pathlib import Path
+import sqlite3
+
+# discovered, not fetched yet
+PENDING = "pending"
+# fetched, the page can still change and is expanded on every run
+OPEN = "open"
+# match report downloaded, not yet populated into the database
+FETCHED = "fetched"
+# final, never requested again
+CLOSED = "closed"
+
+_COLUMNS = "url, page_type, season, status, last_fetch, content_hash, children"
+_Row = tuple[str, str, int, str, str | None, str | None, str | None]
+
+
+@dataclass(frozen=True, slots=True)
+class FrontierEntry:
+    URL: str
+    page_type: str
+    season: int
+    status: str
+    last_fetch: datetime | None
+    content_hash: str | None
+    # None: not expanded yet
+    children: list[str] | None
+
+
+class CrawlFrontier:
+    """Persistent crawl state of all season, division and match report pages.
+
+    Every page is recorded with its season, the time of the last fetch, a
+    hash of its content, its status and the URLs it links to. Closed pages are
+    never due again, so a run only expands the pages that can still change and
+    fetches the match reports discovered since the last run.
+    """
+
+    def __init__(self, logger: Logger, frontier_path: Path) -> None:
+        self._logger = logger
+        self._frontier_path = frontier_path
+        self._connection: sqlite3.Connection | None = None
+
+    def get(self, URL: str) -> FrontierEntry | None:
+        row = (
+            self._get_connection()
+            .execute(f"SELECT {_COLUMNS} FROM pages WHERE url = ?", (URL,))
+            .fetchone()
+        )
+        return _to_entry(row) if row else None
+
+    def get_due(self, page_type: str, season: int | None = None) -> list[FrontierEntry]:
+        """Returns the pending, open and fetched pages ordered by URL."""
+        query = (
+            f"SELECT {_COLUMNS} FROM pages "
+            "WHERE page_type = ? AND status IN (?, ?, ?)"
+        )
+        parameters: list[str | int] = [page_type, PENDING, OPEN, FETCHED]
+        if season is not None:
+            query += " AND season = ?"
+            parameters.append(season)
+        rows = self._get_connection().execute(f"{query} ORDER BY url", parameters)
+        return [_to_entry(row) for row in rows]
+
+    def add(self, URLs: list[str], page_type: str, season: int) -> int:
+        """Adds newly discovered pages as pending, known pages stay unchanged.
+
+        Returns:
+            Number of new pages.
+        """
+        with self._get_connection() as connection:
+            cursor = connection.executemany(
+                "INSERT OR IGNORE INTO pages (url, page_type, season, status) "
+                "VALUES (?, ?, ?, ?)",
+                [(URL, page_type, season, PENDING) for URL in URLs],
+            )
+        if cursor.rowcount > 0:
+            self._logger.info(f"{cursor.rowcount} new {page_type} pages discovered.")
+        return cursor.rowcount
+
+    def record_fetch(
+        self,
+        URL: str,
+        status: str,
+        content_hash: str | None = None,
+        children: list[str] | None = None,
+    ) -> None:
+        """Stores the result of expanding a page, keeps unknown values."""
+        with self._get_connection() as connection:
+            connection.execute(
+                "UPDATE pages SET status = ?, last_fetch = ?, "
+                "content_hash = COALESCE(?, content_hash), "
+                "children = COALESCE(?, children) WHERE url = ?",
+                (
+                    status,
+                    datetime.now().isoformat(timespec="seconds"),
+                    content_hash,
+                    None if children is None else json.dumps(children),
+                    URL,
+                ),
+            )
+
+    def set_status(self, URLs: list[str], status: str) -> None:
+        with self._get_connection() as connection:
+            connection.executemany(
+                "UPDATE pages SET status = ? WHERE url = ?",
+                [(status, URL) for URL in URLs],
+            )
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self._frontier_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS pages ("
+                    "url TEXT PRIMARY KEY, "
+                    "page_type TEXT NOT NULL, "
+                    "season INTEGER NOT NULL, "
+                    "status TEXT NOT NULL, "
+                    "last_fetch TEXT, "
+                    "content_hash TEXT, "
+                    "children TEXT)"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS pages_due "
+                    "ON pages (page_type, status, season)"
+                )
+            self._connection = connection
+        return self._connection
+
+
+def _to_entry(row: _Row) -> FrontierEntry:
+    URL, page_type, season, status, last_fetch, content_hash, children = row
+    return FrontierEntry(
+        URL=URL,
+        page_type=page_type,
+        season=season,
+        status=status,
+        last_fetch=datetime.fromisoformat(last_fetch) if last_fetch else None,
+        content_hash=content_hash,
+        children=json.loads(children) if children is not None else None,
+    )
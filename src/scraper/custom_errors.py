@@ -1,3 +1,7 @@
 class ElementNotFound(Exception):
     def __init__(self, message):
         super().__init__(message)
+
+
+class ResumeNotPossible(Exception):
+    """An interrupted rebuild cannot continue where it stopped."""
@@ -1,20 +1,29 @@
-from datetime import datetime
+from collections.abc import Iterable, Iterator
+from dataclasses import asdict
+from datetime import date
+import itertools
 from logging import Logger
 from pathlib import Path
 import traceback
-from typing import Any, cast
+from typing import Any
+import uuid
 
 from bs4 import BeautifulSoup
+from sqlalchemy import and_, delete, func, insert, or_, select
 from sqlalchemy.orm import Session
-import trueskill
 
+from scraper.custom_errors import ResumeNotPossible
 from scraper.extractor import Extractor
 from scraper.file_handler import FileHandler
-from scraper.skill_calc import SkillCalc
+from scraper.identity_map import IdentityMap
+from scraper.match_report import MatchReport
+from scraper.player_metadata_backfill import PlayerMetadataBackfill
+from scraper.rating_ledger import COMBINED, DOUBLES, SINGLES, RatingLedger
 from shared.config.settings import Settings
 from shared.database.database import Database
 from shared.database.models import (
     Association,
+    BaseModel,
     Division,
     DivisionName,
     Match,
@@ -22,10 +31,13 @@ from shared.database.models import (
     Organisation,
     Player,
     PlayerCategory,
+    PopulationProgress,
+    RatingCheckpoint,
     Season,
     Team,
     TeamMembership,
 )
+from shared.database.rating_checkpoints import RatingCheckpoints
 
 
 class DbPopulator:
@@ -36,107 +48,506 @@ class DbPopulator:
         extractor: Extractor,
         database: Database,
         filehandler: FileHandler,
+        player_metadata_backfill: PlayerMetadataBackfill,
     ) -> None:
         self._logger = logger
         self._settings = settings
         self._extractor = extractor
         self._database = database
         self._filehandler = filehandler
+        self._player_metadata_backfill = player_metadata_backfill
+        # new players without enriched metadata since the last commit
+        self._players_without_metadata: set[str] = set()
+        # a single long-lived session keeps the cached instances attached
+        self._session: Session | None = None
+        # rows waiting for the next bulk INSERT, in rating order
+        self._pending_matches: list[dict[str, Any]] = []
+        self._pending_participants: list[dict[str, Any]] = []
+        self._rating_ledger = RatingLedger()
+        self._rating_checkpoints = RatingCheckpoints()
+        # season of the last match and matches since the last checkpoint
+        self._checkpoint_season: int | None = None
+        self._matches_since_checkpoint = 0
+        self._identity_map = IdentityMap(
+            logger=logger,
+            indexes={
+                "season": (Season, lambda season: season.season_year),
+                "division": (
+                    Division,
+                    lambda division: (
+                        division.name,
+                        division.hierarchy,
+                        division.region,
+                        division.season_id,
+                    ),
+                ),
+                "organisation": (Organisation, lambda organisation: organisation.name),
+                "association": (Association, lambda association: association.name),
+                "team": (Team, lambda team: (team.name, team.division_id)),
+                "player": (Player, lambda player: player.name),
+                "team_membership": (
+                    TeamMembership,
+                    lambda membership: (
+                        membership.player_id,
+                        membership.team_id,
+                        membership.season_id,
+                    ),
+                ),
+                "season_membership": (
+                    TeamMembership,
+                    lambda membership: (membership.player_id, membership.season_id),
+                ),
+            },
+        )
+
+    def reset(self) -> None:
+        """Drops the session and all cached instances, e.g. after `init_db`."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        self._identity_map.clear()
+        self._pending_matches.clear()
+        self._pending_participants.clear()
+        self._checkpoint_season = None
+        self._matches_since_checkpoint = 0
+        self._players_without_metadata.clear()
+
+    def _get_session(self) -> Session:
+        if self._session is None:
+            self._session = Session(
+                bind=self._database.sync_engine,
+                autoflush=False,
+                # cached instances stay usable across transactions
+                expire_on_commit=False,
+            )
+            self._identity_map.warm(self._session)
+            self._load_checkpoint_state(self._session)
+        return self._session
 
     def populate(self, page_id: int, html: BeautifulSoup) -> None:
         """Main function to populate the database with extracted data."""
-        session = self._database.get_sync_session()
         # Extract match metadata and data
         self._logger.debug("Extracting match metadata and data...")
-        self._extractor.extract_data(page_id, html)
-        season_year = self._extractor.season
-        association_home_team = self._extractor.meta["association_home_team"]
-        association_away_team = self._extractor.meta["association_away_team"]
+        report = self._extractor.extract_data(page_id, html)
+        self.populate_extracted(report)
+
+    def populate_extracted(self, report: MatchReport) -> None:
+        """Populates the database with an already extracted match report."""
+        session = self._get_session()
+        checkpoint_due = self._is_checkpoint_due(report)
         try:
-            # Create or get season
-            self._logger.debug("Creating season.")
-            season = self._get_or_create_season(session, season_year)
-
-            # Create or get division
-            self._logger.debug("Creating division.")
-            division = self._get_or_create_division(
-                session,
-                cast(str, self._extractor.meta["division_name"]),
-                cast(int, self._extractor.meta["division_hierarchy"]),
-                cast(str, self._extractor.meta["division_region"]),
-                season,
+            if checkpoint_due:
+                self._write_checkpoint()
+            self._populate_report(report)
+
+            # Commit transaction
+            self._write_pending()
+            session.commit()
+            self._identity_map.commit()
+            self._advance_checkpoint_state(report, checkpoint_due)
+            self._backfill_player_metadata()
+            self._logger.info("Database populated successfully.")
+
+        except Exception as e:
+            session.rollback()
+            self._identity_map.rollback()
+            self._pending_matches.clear()
+            self._pending_participants.clear()
+            self._logger.error(f"Error populating database: {e!s}")
+            self._logger.error(traceback.format_exc())
+
+            # Re-raise the exception to stop further execution
+            raise
+
+    def populate_batch(
+        self, reports: Iterable[MatchReport], resume: bool = False
+    ) -> list[int]:
+        """Populates the database with many match reports per transaction.
+
+        Every `DB_COMMIT_BATCH_SIZE` match reports are committed together, each
+        one in its own savepoint: a failing match report is rolled back, logged
+        and skipped. The page id of the last committed match report is stored
+        with every commit, with `resume` the reports up to it are skipped.
+
+        Raises:
+            ResumeNotPossible: The last committed match report is not among
+                `reports` anymore.
+
+        Returns:
+            Page ids of the skipped match reports.
+        """
+        session = self._get_session()
+        progress = session.scalars(select(PopulationProgress)).first()
+        if progress is None:
+            progress = PopulationProgress()
+            session.add(progress)
+        elif resume and progress.last_page_id is not None:
+            self._logger.info(
+                f"Resuming after match report {progress.last_page_id} "
+                f"({progress.report_count} match reports committed)."
             )
+            reports = self._skip_until(reports, progress.last_page_id)
+        else:
+            progress.last_page_id = None
+            progress.report_count = 0
+            progress.completed = False
+
+        failed_page_ids = []
+        batches = itertools.batched(reports, self._settings.DB_COMMIT_BATCH_SIZE)
+        for batch in batches:
+            for report in batch:
+                if not self._populate_in_savepoint(session, report):
+                    failed_page_ids.append(report.page_id)
+            progress.last_page_id = batch[-1].page_id
+            progress.report_count += len(batch)
+            self._commit_batch(session)
+            self._logger.info(
+                f"Committed {progress.report_count} match reports, "
+                f"last page id {progress.last_page_id}."
+            )
+        progress.completed = True
+        self._commit_batch(session)
+        return failed_page_ids
+
+    def has_unfinished_batch(self) -> bool:
+        """Checks if a batched population run was interrupted."""
+        session = self._get_session()
+        completed = session.scalar(select(PopulationProgress.completed))
+        session.rollback()
+        return completed is False
+
+    def _skip_until(
+        self, reports: Iterable[MatchReport], page_id: int
+    ) -> Iterator[MatchReport]:
+        reports = iter(reports)
+        for report in reports:
+            if report.page_id == page_id:
+                yield from reports
+                return
+        # completing now would mark a partly populated database as finished
+        raise ResumeNotPossible(
+            f"Last committed match report {page_id} not found in the cache."
+        )
 
-            # Create or get organisation
-            self._logger.debug("Creating organisation.")
-            organisation = self._get_or_create_organisation(
-                session,
+    def _populate_in_savepoint(self, session: Session, report: MatchReport) -> bool:
+        identity_savepoint = self._identity_map.savepoint()
+        checkpoint_due = self._is_checkpoint_due(report)
+        savepoint = session.begin_nested()
+        try:
+            if checkpoint_due:
+                self._write_checkpoint()
+            self._populate_report(report)
+            self._write_pending()
+            savepoint.commit()
+        except Exception as e:
+            # expires the players whose ratings were changed in the savepoint
+            savepoint.rollback()
+            self._identity_map.rollback(identity_savepoint)
+            self._pending_matches.clear()
+            self._pending_participants.clear()
+            self._logger.error(f"Skipping match report {report.page_id}: {e!s}")
+            self._logger.error(traceback.format_exc())
+            return False
+        self._advance_checkpoint_state(report, checkpoint_due)
+        return True
+
+    def _commit_batch(self, session: Session) -> None:
+        try:
+            session.commit()
+        except Exception:
+            session.rollback()
+            self._identity_map.rollback()
+            self._load_checkpoint_state(session)
+            raise
+        self._identity_map.commit()
+        self._backfill_player_metadata()
+
+    def rewind(self, since: date, page_ids: Iterable[int] = ()) -> set[int]:
+        """Removes all matches from the first affected one on and restores ratings.
+
+        The first affected match is the first one played on or after `since`
+        or belonging to one of the match reports `page_ids`. Every player gets
+        the rating after their last match before it, players without an earlier
+        match get the initial rating. Team memberships, players, teams,
+        divisions and seasons only created by the removed matches are deleted.
+        The removed matches have to be replayed in chronological order
+        afterwards.
+
+        Returns:
+            Page ids of the removed match reports.
+        """
+        session = self._get_session()
+        try:
+            start = session.scalar(
+                select(func.min(Match.global_match_nr)).where(
+                    or_(Match.date >= since, Match.BTFV_from_id.in_(list(page_ids)))
+                )
             )
+            if start is None:
+                session.rollback()
+                return set()
 
-            # Create or get association
-            self._logger.debug("Creating association.")
-            home_team_association = self._get_or_create_association(
-                session,
-                name=cast(str, association_home_team),
-                organisation=organisation,
+            removed_page_ids = set(
+                session.scalars(
+                    select(Match.BTFV_from_id)
+                    .where(Match.global_match_nr >= start)
+                    .distinct()
+                )
+            )
+            last_ratings = self._rating_checkpoints.get_ratings(
+                session, before_global_match_nr=start
             )
-            away_team_association = self._get_or_create_association(
-                session,
-                name=cast(str, association_away_team),
-                organisation=organisation,
+            session.execute(
+                delete(RatingCheckpoint).where(
+                    RatingCheckpoint.last_global_match_nr >= start
+                )
+            )
+            session.execute(
+                delete(MatchParticipant).where(
+                    MatchParticipant.match_id.in_(
+                        select(Match.id).where(Match.global_match_nr >= start)
+                    )
+                )
             )
+            session.execute(delete(Match).where(Match.global_match_nr >= start))
 
-            # Create or get teams
-            self._logger.debug("Creating teams.")
-            home_team = self._get_or_create_team(
-                session,
-                cast(str, self._extractor.meta["home_team"]),
-                division,
-                home_team_association,
+            initial = (self._rating_ledger.mu, self._rating_ledger.sigma) * 3
+            for player in session.scalars(select(Player)):
+                (
+                    player.current_mu_combined,
+                    player.current_sigma_combined,
+                    player.current_mu_singles,
+                    player.current_sigma_singles,
+                    player.current_mu_doubles,
+                    player.current_sigma_doubles,
+                ) = last_ratings.get(player.id, initial)
+            # the rating updates must reach the players before any is deleted
+            session.flush()
+            self._delete_unreferenced(session)
+            session.commit()
+        except Exception:
+            session.rollback()
+            self._identity_map.rollback()
+            raise
+        # deleted instances must not be served from the identity map
+        self.reset()
+
+        self._logger.info(
+            f"Removed matches from global match nr {start} on "
+            f"({len(removed_page_ids)} match reports)."
+        )
+        return removed_page_ids
+
+    def _delete_unreferenced(self, session: Session) -> None:
+        """Deletes the rows only created by the removed matches.
+
+        Team memberships without a remaining match of the player for the team
+        in that season, and players, teams, divisions and seasons without any
+        remaining match. Associations are kept.
+        """
+        participation = (
+            select(MatchParticipant.id)
+            .join(Match, MatchParticipant.match_id == Match.id)
+            .where(
+                MatchParticipant.player_id == TeamMembership.player_id,
+                Match.season_id == TeamMembership.season_id,
+                or_(
+                    and_(
+                        MatchParticipant.team_side == "home",
+                        Match.home_team_id == TeamMembership.team_id,
+                    ),
+                    and_(
+                        MatchParticipant.team_side == "away",
+                        Match.away_team_id == TeamMembership.team_id,
+                    ),
+                ),
+            )
+        )
+        # in foreign key order
+        conditions: list[tuple[type[BaseModel], list[Any]]] = [
+            (TeamMembership, [~participation.exists()]),
+            (
+                Player,
+                [
+                    ~select(MatchParticipant.id)
+                    .where(MatchParticipant.player_id == Player.id)
+                    .exists()
+                ],
+            ),
+            (
+                Team,
+                [
+                    ~select(Match.id)
+                    .where(
+                        or_(
+                            Match.home_team_id == Team.id, Match.away_team_id == Team.id
+                        )
+                    )
+                    .exists()
+                ],
+            ),
+            (
+                Division,
+                [~select(Team.id).where(Team.division_id == Division.id).exists()],
+            ),
+            (
+                Season,
+                [
+                    ~select(Division.id)
+                    .where(Division.season_id == Season.id)
+                    .exists(),
+                    ~select(Match.id).where(Match.season_id == Season.id).exists(),
+                ],
+            ),
+        ]
+        for model, where in conditions:
+            result: Any = session.execute(
+                delete(model).where(*where).execution_options(synchronize_session=False)
             )
-            away_team = self._get_or_create_team(
-                session,
-                cast(str, self._extractor.meta["away_team"]),
-                division,
-                away_team_association,
+            if result.rowcount:
+                self._logger.info(
+                    f"Deleted {result.rowcount} unreferenced {model.__tablename__}."
+                )
+
+    def _load_checkpoint_state(self, session: Session) -> None:
+        last_checkpoint_nr = session.scalar(
+            select(func.max(RatingCheckpoint.last_global_match_nr))
+        )
+        self._matches_since_checkpoint = (
+            session.scalar(
+                select(func.count(Match.id)).where(
+                    Match.global_match_nr > (last_checkpoint_nr or 0)
+                )
             )
+            or 0
+        )
+        self._checkpoint_season = session.scalar(
+            select(Season.season_year)
+            .join(Match, Match.season_id == Season.id)
+            .order_by(Match.global_match_nr.desc())
+            .limit(1)
+        )
+
+    def _is_checkpoint_due(self, report: MatchReport) -> bool:
+        """Checks if the ratings before `report` should be stored as checkpoint.
+
+        Checkpoints are written at the end of each season and every
+        `RATING_CHECKPOINT_INTERVAL` matches.
+        """
+        if not self._matches_since_checkpoint:
+            return False
+        interval = self._settings.RATING_CHECKPOINT_INTERVAL
+        return report.season != self._checkpoint_season or (
+            interval > 0 and self._matches_since_checkpoint >= interval
+        )
 
-            # Process matches and players
-            self._logger.info("Processing matches...")
-            self._create_matches_and_players(
-                session,
-                home_team,
-                away_team,
-                season,
-                page_id,
+    def _advance_checkpoint_state(
+        self, report: MatchReport, checkpoint_written: bool
+    ) -> None:
+        if checkpoint_written:
+            self._matches_since_checkpoint = 0
+        self._matches_since_checkpoint += len(report.matches)
+        self._checkpoint_season = report.season
+
+    def _get_player_ratings(self) -> dict[uuid.UUID, tuple[float, ...]]:
+        return {
+            player.id: (
+                player.current_mu_combined,
+                player.current_sigma_combined,
+                player.current_mu_singles,
+                player.current_sigma_singles,
+                player.current_mu_doubles,
+                player.current_sigma_doubles,
             )
+            for player in self._identity_map.values("player")
+        }
+
+    def _write_checkpoint(self) -> None:
+        """Stores the current ratings of all players after the last match."""
+        session = self._get_session()
+        last_match = session.execute(
+            select(Match.global_match_nr, Match.date)
+            .order_by(Match.global_match_nr.desc())
+            .limit(1)
+        ).one()
+        checkpoint = self._rating_checkpoints.create(
+            last_match.global_match_nr, last_match.date, self._get_player_ratings()
+        )
+        session.add(checkpoint)
+        self._logger.info(
+            f"Rating checkpoint after global match nr {last_match.global_match_nr} "
+            f"({checkpoint.player_count} players)."
+        )
 
-            # Commit transaction
-            session.commit()
-            self._logger.info("Database populated successfully.")
+    def _populate_report(self, report: MatchReport) -> None:
+        # Create or get season
+        self._logger.debug("Creating season.")
+        season = self._get_or_create_season(report.season)
+
+        # Create or get division
+        self._logger.debug("Creating division.")
+        division = self._get_or_create_division(
+            report.division_name,
+            report.division_hierarchy,
+            report.division_region,
+            season,
+        )
 
-        except Exception as e:
-            session.rollback()
-            self._logger.error(f"Error populating database: {e!s}")
-            self._logger.error(traceback.format_exc())
+        # Create or get organisation
+        self._logger.debug("Creating organisation.")
+        organisation = self._get_or_create_organisation()
 
-            # Re-raise the exception to stop further execution
-            raise
-        finally:
-            session.close()
+        # Create or get association
+        self._logger.debug("Creating association.")
+        home_team_association = self._get_or_create_association(
+            name=report.association_home_team,
+            organisation=organisation,
+        )
+        away_team_association = self._get_or_create_association(
+            name=report.association_away_team,
+            organisation=organisation,
+        )
+
+        # Create or get teams
+        self._logger.debug("Creating teams.")
+        home_team = self._get_or_create_team(
+            report.home_team,
+            division,
+            home_team_association,
+        )
+        away_team = self._get_or_create_team(
+            report.away_team,
+            division,
+            away_team_association,
+        )
 
-    def _get_or_create_season(self, session: Session, season_year: int) -> Season:
+        # Process matches and players
+        self._logger.info("Processing matches...")
+        self._create_matches_and_players(
+            home_team,
+            away_team,
+            season,
+            report,
+        )
+
+    def _add_instance(self, instance: BaseModel) -> None:
+        """Adds a newly created instance to the session and the identity map."""
+        session = self._get_session()
+        session.add(instance)
+        # Ensure the record is saved to the database
+        session.flush()
+        self._identity_map.add(instance)
+
+    def _get_or_create_season(self, season_year: int) -> Season:
         """Retrieve or create a new Season."""
-        season = session.query(Season).filter_by(season_year=season_year).first()
+        season = self._identity_map.get("season", season_year, Season)
         if not season:
             season = Season(season_year=season_year)
-            session.add(season)
-            session.flush()
+            self._add_instance(season)
         return season
 
     def _get_or_create_division(
         self,
-        session: Session,
         division_name: str,
         hierarchy: int,
         region: str,
@@ -145,15 +556,8 @@ class DbPopulator:
         """Retrieve or create a new Division."""
         # Convert division_name string to Division Enum
         division_enum = self.get_division_enum_from_value(division_name)
-        division = (
-            session.query(Division)
-            .filter_by(
-                name=division_enum,
-                hierarchy=hierarchy,
-                region=region,
-                season_id=season.id,
-            )
-            .first()
+        division = self._identity_map.get(
+            "division", (division_enum, hierarchy, region, season.id), Division
         )
         if not division:
             division = Division(
@@ -162,84 +566,40 @@ class DbPopulator:
                 region=region,
                 season_id=season.id,
             )
-            session.add(division)
-            session.flush()
+            self._add_instance(division)
         return division
 
     def _get_or_create_team(
         self,
-        session: Session,
         team_name: str,
         division: Division,
         association: Association,
     ) -> Team:
         """Retrieve or create a new Team."""
-        team = (
-            session.query(Team)
-            .filter_by(name=team_name, division_id=division.id)
-            .first()
-        )
+        team = self._identity_map.get("team", (team_name, division.id), Team)
         if not team:
             team = Team(
                 name=team_name, division_id=division.id, association_id=association.id
             )
-            session.add(team)
-            session.flush()
+            self._add_instance(team)
         return team
 
     def _get_or_create_player(
         self,
-        session: Session,
         player_name: str,
     ) -> Player:
         """Retrieve or create a new Player."""
         self._logger.info(f"Processing: {player_name}")
-        player = session.query(Player).filter_by(name=player_name).first()
+        player = self._identity_map.get("player", player_name, Player)
         if not player:
-            player_html_path = self._filehandler.generate_path_for_player_html(
-                player_name=player_name
-            )
-            player_image_path: Path | None = (
-                self._filehandler.generate_path_for_player_image(
-                    player_name=player_name
-                )
-            )
-
-            if self._filehandler.exists(player_html_path):
-                html = self._filehandler.read_HTML(file_path=player_html_path)
-                player_info = self._extractor.extract_DTFB_player_information(
-                    player_html=html, player_name=player_name
-                )
-                category_string = player_info.get("category", None)
-                if category_string:
-                    category = PlayerCategory(player_info.get("category"))
-            else:
-                category = None
-                player_info = {}
-
-            if not self._filehandler.exists(cast(Path, player_image_path)):
-                player_image_path = None
-                if category == PlayerCategory.HERREN:
-                    # use placeholder image for men
-                    player_image_file_name = "dummy_avatar_mann.png"
-                elif category == PlayerCategory.DAMEN:
-                    # use placeholder image for women
-                    player_image_file_name = "dummy_avatar_frau.png"
-                else:
-                    # use placeholder binary / unknown
-                    player_image_file_name = "dummy_avatar_binary.jpg"
-            else:
-                # use filename of existing image
-                if player_image_path:
-                    player_image_file_name = player_image_path.name
-
+            metadata = self._filehandler.get_player_metadata(player_name=player_name)
+            if metadata is None:
+                # resolved in the background once the player row is committed
+                self._players_without_metadata.add(player_name)
             DTFB_from_id: int | None = self._get_DTFB_from_id(player_name=player_name)
 
             player = Player(
                 name=player_name,
-                category=category if category else PlayerCategory.UNBEKANNT,
-                national_id=player_info.get("national_id", None),
-                international_id=player_info.get("international_id", None),
                 # default values for mu and sigma
                 current_mu_combined=25.0,
                 current_sigma_combined=8.0,
@@ -248,480 +608,150 @@ class DbPopulator:
                 current_mu_doubles=25.0,
                 current_sigma_doubles=8.0,
                 DTFB_from_id=DTFB_from_id,
-                image_file_name=player_image_file_name,  # store filename only, not path
+                **PlayerMetadataBackfill.get_player_values(metadata),
             )
-            session.add(player)
-            session.flush()
+            self._add_instance(player)
         return player
 
+    def _backfill_player_metadata(self) -> None:
+        # players of rolled back reports are not found and skipped
+        if self._players_without_metadata:
+            self._player_metadata_backfill.enqueue(self._players_without_metadata)
+            self._players_without_metadata = set()
+
     def _get_DTFB_from_id(self, player_name: str) -> int | None:
-        csv_data = self._filehandler.read_csv_as_dict(self._settings.DTFB_CSV_FILE)
-        for row in csv_data:
-            if row["player_name"] == player_name:
-                if row["DTFB_from_id"]:
-                    return int(row["DTFB_from_id"])
-                return None
-        return None
+        entry = self._filehandler.get_player_lookup_by_name(player_name=player_name)
+        return entry.DTFB_from_id if entry else None
 
     def _create_matches_and_players(
         self,
-        session: Session,
         home_team: Team,
         away_team: Team,
         season: Season,
-        page_id: int,
+        report: MatchReport,
     ) -> None:
         """Process match and player data, create necessary records."""
-        if self._draws_possible(self._extractor.matches):
-            env_draw_probability_double = 0.2
-        else:
-            env_draw_probability_double = 0.0
-        env_draw_probability_single = 0.0
-
-        # Create SkillCalc instances for singles and doubles
-        self.skill_calc_single = SkillCalc(draw_probability=env_draw_probability_single)
-        self.skill_calc_double = SkillCalc(draw_probability=env_draw_probability_double)
-
-        for match_data in self._extractor.matches:
+        # the players are the source of truth, the ledger only does the math
+        players: dict[str, Player] = {}
+        for match_data in report.matches:
+            for player_name in (
+                match_data.p_home1,
+                match_data.p_home2,
+                match_data.p_away1,
+                match_data.p_away2,
+            ):
+                if player_name is None or player_name in players:
+                    continue
+                player = self._get_or_create_player(player_name)
+                players[player_name] = player
+                self._rating_ledger.set_rating(
+                    player_name,
+                    COMBINED,
+                    player.current_mu_combined,
+                    player.current_sigma_combined,
+                )
+                self._rating_ledger.set_rating(
+                    player_name,
+                    SINGLES,
+                    player.current_mu_singles,
+                    player.current_sigma_singles,
+                )
+                self._rating_ledger.set_rating(
+                    player_name,
+                    DOUBLES,
+                    player.current_mu_doubles,
+                    player.current_sigma_doubles,
+                )
+
+        for rated_match in self._rating_ledger.replay_report(report):
+            match_data = rated_match.match
             self._logger.info(match_data)
 
-            if match_data["match_type"] == "single":
-                self._logger.debug("Processing single match")
-                home_player1 = self._get_or_create_player(
-                    session, cast(str, match_data["p_home1"])
-                )
-                away_player1 = self._get_or_create_player(
-                    session, cast(str, match_data["p_away2"])
-                )
-
-                # Create TrueSkill Rating objects singles and doubles (combined)
-                h1_before_combined = self.skill_calc_single.create_rating(
-                    mu=home_player1.current_mu_combined,
-                    sigma=home_player1.current_sigma_combined,
-                )
-                a1_before_combined = self.skill_calc_single.create_rating(
-                    mu=away_player1.current_mu_combined,
-                    sigma=away_player1.current_sigma_combined,
-                )
-
-                # Create TrueSkill Rating objects for singles (singles only)
-                h1_before_singles = self.skill_calc_single.create_rating(
-                    mu=home_player1.current_mu_singles,
-                    sigma=home_player1.current_sigma_singles,
-                )
-                a1_before_singles = self.skill_calc_single.create_rating(
-                    mu=away_player1.current_mu_singles,
-                    sigma=away_player1.current_sigma_singles,
-                )
-
-                # Combined Rating Calculation
-                (
-                    h1_after_combined,
-                    a1_after_combined,
-                ) = self.skill_calc_single.rate_single_match(
-                    h1_before_combined,
-                    a1_before_combined,
-                    winner="player1" if match_data["who_won"] == "home" else "player2",
-                )
-
-                # Singles Rating Calculation
-                (
-                    h1_after_singles,
-                    a1_after_singles,
-                ) = self.skill_calc_single.rate_single_match(
-                    h1_before_singles,
-                    a1_before_singles,
-                    winner="player1" if match_data["who_won"] == "home" else "player2",
-                )
-
-                # Update current player ratings for combined and singles
-                home_player1.current_mu_combined = h1_after_combined.mu
-                home_player1.current_sigma_combined = h1_after_combined.sigma
-                away_player1.current_mu_combined = a1_after_combined.mu
-                away_player1.current_sigma_combined = a1_after_combined.sigma
-
-                home_player1.current_mu_singles = h1_after_singles.mu
-                home_player1.current_sigma_singles = h1_after_singles.sigma
-                away_player1.current_mu_singles = a1_after_singles.mu
-                away_player1.current_sigma_singles = a1_after_singles.sigma
-
-                # Calculate Draw and Win Probabilities using Singles Ratings
-                draw_probability = self.skill_calc_single.env.quality(
-                    [[h1_before_singles], [a1_before_singles]]
-                )
-                win_probability = self.skill_calc_single.win_probability(
-                    [h1_before_singles], [a1_before_singles]
-                )
-
-                session.flush()
-
-                player_ratings_combined = (
-                    h1_before_combined,
-                    h1_after_combined,
-                    a1_before_combined,
-                    a1_after_combined,
-                )
-                player_ratings_singles = (
-                    h1_before_singles,
-                    h1_after_singles,
-                    a1_before_singles,
-                    a1_after_singles,
-                )
-
-            elif match_data["match_type"] == "double":
-                self._logger.debug("Processing double match")
-                home_player1 = self._get_or_create_player(
-                    session, cast(str, match_data["p_home1"])
-                )
-                home_player2 = self._get_or_create_player(
-                    session, cast(str, match_data["p_home2"])
-                )
-                away_player1 = self._get_or_create_player(
-                    session, cast(str, match_data["p_away1"])
-                )
-                away_player2 = self._get_or_create_player(
-                    session, cast(str, match_data["p_away2"])
-                )
-
-                # Create TrueSkill Rating objects for doubles (combined)
-                h1_before_combined = self.skill_calc_double.create_rating(
-                    mu=home_player1.current_mu_combined,
-                    sigma=home_player1.current_sigma_combined,
-                )
-                h2_before_combined = self.skill_calc_double.create_rating(
-                    mu=home_player2.current_mu_combined,
-                    sigma=home_player2.current_sigma_combined,
-                )
-                a1_before_combined = self.skill_calc_double.create_rating(
-                    mu=away_player1.current_mu_combined,
-                    sigma=away_player1.current_sigma_combined,
-                )
-                a2_before_combined = self.skill_calc_double.create_rating(
-                    mu=away_player2.current_mu_combined,
-                    sigma=away_player2.current_sigma_combined,
-                )
-
-                # Create TrueSkill Rating objects for doubles (doubles only)
-                h1_before_doubles = self.skill_calc_double.create_rating(
-                    mu=home_player1.current_mu_doubles,
-                    sigma=home_player1.current_sigma_doubles,
-                )
-                h2_before_doubles = self.skill_calc_double.create_rating(
-                    mu=home_player2.current_mu_doubles,
-                    sigma=home_player2.current_sigma_doubles,
-                )
-                a1_before_doubles = self.skill_calc_double.create_rating(
-                    mu=away_player1.current_mu_doubles,
-                    sigma=away_player1.current_sigma_doubles,
-                )
-                a2_before_doubles = self.skill_calc_double.create_rating(
-                    mu=away_player2.current_mu_doubles,
-                    sigma=away_player2.current_sigma_doubles,
-                )
-
-                # Combined Rating Calculation
-                (
-                    (h1_after_combined, h2_after_combined),
-                    (a1_after_combined, a2_after_combined),
-                ) = self.skill_calc_double.rate_double_match(
-                    [h1_before_combined, h2_before_combined],
-                    [a1_before_combined, a2_before_combined],
-                    winner="team1" if match_data["who_won"] == "home" else "team2",
-                )
-
-                # Doubles Rating Calculation
-                (
-                    (h1_after_doubles, h2_after_doubles),
-                    (a1_after_doubles, a2_after_doubles),
-                ) = self.skill_calc_double.rate_double_match(
-                    [h1_before_doubles, h2_before_doubles],
-                    [a1_before_doubles, a2_before_doubles],
-                    winner="team1" if match_data["who_won"] == "home" else "team2",
-                )
-
-                # Update current player ratings for combined and doubles
-                home_player1.current_mu_combined = h1_after_combined.mu
-                home_player1.current_sigma_combined = h1_after_combined.sigma
-                home_player2.current_mu_combined = h2_after_combined.mu
-                home_player2.current_sigma_combined = h2_after_combined.sigma
-
-                away_player1.current_mu_combined = a1_after_combined.mu
-                away_player1.current_sigma_combined = a1_after_combined.sigma
-                away_player2.current_mu_combined = a2_after_combined.mu
-                away_player2.current_sigma_combined = a2_after_combined.sigma
-
-                home_player1.current_mu_doubles = h1_after_doubles.mu
-                home_player1.current_sigma_doubles = h1_after_doubles.sigma
-                home_player2.current_mu_doubles = h2_after_doubles.mu
-                home_player2.current_sigma_doubles = h2_after_doubles.sigma
-
-                away_player1.current_mu_doubles = a1_after_doubles.mu
-                away_player1.current_sigma_doubles = a1_after_doubles.sigma
-                away_player2.current_mu_doubles = a2_after_doubles.mu
-                away_player2.current_sigma_doubles = a2_after_doubles.sigma
-
-                # Calculate Draw and Win Probabilities using Doubles Ratings
-                team1_ratings_doubles = [h1_before_doubles, h2_before_doubles]
-                team2_ratings_doubles = [a1_before_doubles, a2_before_doubles]
-
-                draw_probability = self.skill_calc_double.env.quality(
-                    [team1_ratings_doubles, team2_ratings_doubles]
-                )
-                win_probability = self.skill_calc_double.win_probability(
-                    team1_ratings_doubles, team2_ratings_doubles
-                )
-
-                session.flush()
-
-                player_ratings_combined = (  # type: ignore
-                    h1_before_combined,
-                    h1_after_combined,
-                    a1_before_combined,
-                    a1_after_combined,
-                    h2_before_combined,
-                    h2_after_combined,
-                    a2_before_combined,
-                    a2_after_combined,
-                )
-                player_ratings_doubles = (
-                    h1_before_doubles,
-                    h1_after_doubles,
-                    a1_before_doubles,
-                    a1_after_doubles,
-                    h2_before_doubles,
-                    h2_after_doubles,
-                    a2_before_doubles,
-                    a2_after_doubles,
-                )
-
-            # Create match record
-            match = Match(
-                match_nr=int(match_data["match_number"]),
-                date=cast(datetime, self._extractor.meta["matchdate"]),
-                match_day_nr=cast(int, self._extractor.meta["matchday"]),
-                draw_probability=draw_probability,
-                win_probability=win_probability,
-                sets_home=int(match_data["sets_home"]),
-                sets_away=int(match_data["sets_away"]),
-                who_won=str(match_data["who_won"]),
-                match_type=str(match_data["match_type"]),
-                home_team_id=home_team.id,
-                away_team_id=away_team.id,
-                season_id=season.id,
-                BTFV_from_id=page_id,
+            # Create match record, written with the next bulk INSERT
+            match_id = uuid.uuid4()
+            self._pending_matches.append(
+                {
+                    "id": match_id,
+                    "match_nr": match_data.match_number,
+                    "date": report.matchdate,
+                    "match_day_nr": report.matchday,
+                    "draw_probability": rated_match.draw_probability,
+                    "win_probability": rated_match.win_probability,
+                    "sets_home": match_data.sets_home,
+                    "sets_away": match_data.sets_away,
+                    "who_won": match_data.who_won,
+                    "match_type": match_data.match_type,
+                    "home_team_id": home_team.id,
+                    "away_team_id": away_team.id,
+                    "season_id": season.id,
+                    "BTFV_from_id": report.page_id,
+                }
             )
 
-            session.add(match)
-            session.flush()
-
-            # Add participants to the match
-            if match_data["match_type"] == "single":
-                self._add_match_participants(
-                    session,
-                    match,
-                    match_data,
-                    home_team,
-                    away_team,
+            # Add participants to the match and record team memberships
+            for participant in rated_match.participants:
+                player = players[participant.player_name]
+                self._get_or_create_team_membership(
+                    player,
+                    home_team if participant.team_side == "home" else away_team,
                     season,
-                    player_ratings_combined=player_ratings_combined,
-                    player_ratings_singles=player_ratings_singles,
                 )
-            elif match_data["match_type"] == "double":
-                self._add_match_participants(
-                    session,
-                    match,
-                    match_data,
-                    home_team,
-                    away_team,
-                    season,
-                    player_ratings_combined=player_ratings_combined,
-                    player_ratings_doubles=player_ratings_doubles,
-                )
-
-    def _add_match_participants(
-        self,
-        session: Session,
-        match: Match,
-        match_data: dict[str, str | int],
-        home_team: Team,
-        away_team: Team,
-        season: Season,
-        player_ratings_combined: trueskill.Rating,
-        player_ratings_singles: trueskill.Rating | None = None,
-        player_ratings_doubles: trueskill.Rating | None = None,
-    ) -> None:
-        """Add players to the match and ensure team memberships are recorded."""
-        # Get players for the home and away teams
-        home_player1 = self._get_or_create_player(
-            session, cast(str, match_data["p_home1"])
-        )
-        away_player1 = self._get_or_create_player(
-            session,
-            cast(str, match_data.get("p_away1", ""))
-            or cast(str, match_data.get("p_away2", "")),
-        )
-
-        # Record team memberships for home and away players
-        self._get_or_create_team_membership(session, home_player1, home_team, season)
-        self._get_or_create_team_membership(session, away_player1, away_team, season)
-
-        # Add participants to match (single match: home_player1)
-        match_participant_home1 = MatchParticipant(
-            match_id=match.id,
-            player_id=home_player1.id,
-            team_side="home",
-            mu_before_combined=player_ratings_combined[0].mu,
-            sigma_before_combined=player_ratings_combined[0].sigma,
-            mu_after_combined=player_ratings_combined[1].mu,
-            sigma_after_combined=player_ratings_combined[1].sigma,
-            mu_before_singles=player_ratings_singles[0].mu
-            if player_ratings_singles
-            else None,
-            sigma_before_singles=player_ratings_singles[0].sigma
-            if player_ratings_singles
-            else None,
-            # n. b.: Adding current_mu_singles from Player
-            # As we need both singles and double rating in each MatchParticipant
-            mu_after_singles=player_ratings_singles[1].mu
-            if player_ratings_singles
-            else home_player1.current_mu_singles,
-            sigma_after_singles=player_ratings_singles[1].sigma
-            if player_ratings_singles
-            else home_player1.current_sigma_singles,
-            mu_before_doubles=player_ratings_doubles[0].mu
-            if player_ratings_doubles
-            else None,
-            sigma_before_doubles=player_ratings_doubles[0].sigma
-            if player_ratings_doubles
-            else None,
-            mu_after_doubles=player_ratings_doubles[1].mu
-            # n. b.: Adding current_mu_doubles from Player
-            # As we need both singles and double rating in each MatchParticipant
-            if player_ratings_doubles else home_player1.current_mu_doubles,
-            sigma_after_doubles=player_ratings_doubles[1].sigma
-            if player_ratings_doubles
-            else home_player1.current_sigma_doubles,
-        )
-
-        # Add participants to match (single match: away_player1)
-        match_participant_away1 = MatchParticipant(
-            match_id=match.id,
-            player_id=away_player1.id,
-            team_side="away",
-            mu_before_combined=player_ratings_combined[2].mu,
-            sigma_before_combined=player_ratings_combined[2].sigma,
-            mu_after_combined=player_ratings_combined[3].mu,
-            sigma_after_combined=player_ratings_combined[3].sigma,
-            mu_before_singles=player_ratings_singles[2].mu
-            if player_ratings_singles
-            else None,
-            sigma_before_singles=player_ratings_singles[2].sigma
-            if player_ratings_singles
-            else None,
-            # n. b.: Adding current_mu_singles from Player
-            # As we need both singles and double rating in each MatchParticipant
-            mu_after_singles=player_ratings_singles[3].mu
-            if player_ratings_singles
-            else away_player1.current_mu_singles,
-            sigma_after_singles=player_ratings_singles[3].sigma
-            if player_ratings_singles
-            else away_player1.current_sigma_singles,
-            mu_before_doubles=player_ratings_doubles[2].mu
-            if player_ratings_doubles
-            else None,
-            sigma_before_doubles=player_ratings_doubles[2].sigma
-            if player_ratings_doubles
-            else None,
-            mu_after_doubles=player_ratings_doubles[3].mu
-            # n. b.: Adding current_mu_doubles from Player
-            # As we need both singles and double rating in each MatchParticipant
-            if player_ratings_doubles else away_player1.current_mu_doubles,
-            sigma_after_doubles=player_ratings_doubles[3].sigma
-            if player_ratings_doubles
-            else away_player1.current_sigma_doubles,
-        )
-        session.add(match_participant_home1)
-        session.add(match_participant_away1)
-
-        # Add additional participants for double match
-        if match_data["match_type"] == "double":
-            home_player2 = self._get_or_create_player(
-                session, cast(str, match_data["p_home2"])
-            )
-            away_player2 = self._get_or_create_player(
-                session, cast(str, match_data["p_away2"])
-            )
-
-            self._get_or_create_team_membership(
-                session, home_player2, home_team, season
-            )
-            self._get_or_create_team_membership(
-                session, away_player2, away_team, season
-            )
-
-            # Add participants to match (single match: home_player2)
-            match_participant_home2 = MatchParticipant(
-                match_id=match.id,
-                player_id=home_player2.id,
-                team_side="home",
-                mu_before_combined=player_ratings_combined[4].mu,
-                sigma_before_combined=player_ratings_combined[4].sigma,
-                mu_after_combined=player_ratings_combined[5].mu,
-                sigma_after_combined=player_ratings_combined[5].sigma,
-                mu_before_singles=None,
-                sigma_before_singles=None,
-                # n. b.: Adding current_mu_singles from Player
-                # As we need both singles and double rating in each MatchParticipant
-                mu_after_singles=home_player2.current_mu_singles,
-                sigma_after_singles=home_player2.current_sigma_singles,
-                # adding newly calculated doubles values
-                mu_before_doubles=player_ratings_doubles[4].mu,  # type: ignore
-                sigma_before_doubles=player_ratings_doubles[4].sigma,  # type: ignore
-                mu_after_doubles=player_ratings_doubles[5].mu,  # type: ignore
-                sigma_after_doubles=player_ratings_doubles[5].sigma,  # type: ignore
-            )
-            # Add participants to match (single match: away_player2)
-            match_participant_away2 = MatchParticipant(
-                match_id=match.id,
-                player_id=away_player2.id,
-                team_side="away",
-                mu_before_combined=player_ratings_combined[6].mu,
-                sigma_before_combined=player_ratings_combined[6].sigma,
-                mu_after_combined=player_ratings_combined[7].mu,
-                sigma_after_combined=player_ratings_combined[7].sigma,
-                mu_before_singles=None,
-                sigma_before_singles=None,
-                # n. b.: Adding current_mu_singles from Player
-                # As we need both singles and double rating in each MatchParticipant
-                mu_after_singles=away_player2.current_mu_singles,
-                sigma_after_singles=away_player2.current_sigma_singles,
-                # adding newly calculated doubles values
-                mu_before_doubles=player_ratings_doubles[6].mu,  # type: ignore
-                sigma_before_doubles=player_ratings_doubles[6].sigma,  # type: ignore
-                mu_after_doubles=player_ratings_doubles[7].mu,  # type: ignore
-                sigma_after_doubles=player_ratings_doubles[7].sigma,  # type: ignore
-            )
-            session.add(match_participant_home2)
-            session.add(match_participant_away2)
-
-    def _get_or_create_organisation(self, session: Session) -> Organisation:
+                row = asdict(participant)
+                del row["player_name"]
+                row |= {
+                    "id": uuid.uuid4(),
+                    "match_id": match_id,
+                    "player_id": player.id,
+                }
+                self._pending_participants.append(row)
+
+        # Update current player ratings
+        for player_name, player in players.items():
+            (
+                player.current_mu_combined,
+                player.current_sigma_combined,
+            ) = self._rating_ledger.get_rating(player_name, COMBINED)
+            (
+                player.current_mu_singles,
+                player.current_sigma_singles,
+            ) = self._rating_ledger.get_rating(player_name, SINGLES)
+            (
+                player.current_mu_doubles,
+                player.current_sigma_doubles,
+            ) = self._rating_ledger.get_rating(player_name, DOUBLES)
+
+    def _write_pending(self) -> None:
+        """Writes the pending matches and participants with one INSERT each.
+
+        Called once per match report, inside its transaction or savepoint, so a
+        failing INSERT only affects that report. The rows are inserted in rating
+        order, so the `global_match_nr` identity follows the order of the ratings.
+        """
+        session = self._get_session()
+        if self._pending_matches:
+            session.execute(insert(Match), self._pending_matches)
+            self._pending_matches.clear()
+        if self._pending_participants:
+            session.execute(insert(MatchParticipant), self._pending_participants)
+            self._pending_participants.clear()
+
+    def _get_or_create_organisation(self) -> Organisation:
         """Retrieve or create a new Organisation."""
         # hardcoded: For now there is only BTFV
         name = "Bayerischer Tischfußballverband e.V."
         acronym = "BTFV"
-        organisation = session.query(Organisation).filter_by(name=name).first()
+        organisation = self._identity_map.get("organisation", name, Organisation)
         if not organisation:
             organisation = Organisation()
-            session.add(organisation)
-            session.flush()
+            self._add_instance(organisation)
             self._logger.info(f"Created organisation: {name} ({acronym})")
         return organisation
 
     def _get_or_create_association(
-        self, session: Session, name: str, organisation: Organisation
+        self, name: str, organisation: Organisation
     ) -> Association:
         """Retrieve or create a new Association."""
-        association = session.query(Association).filter_by(name=name).first()
+        association = self._identity_map.get("association", name, Association)
         if not association:
             logo_file_name = self._get_logo_file_name(name)
             association = Association(
@@ -729,8 +759,7 @@ class DbPopulator:
                 organisation_id=organisation.id,
                 logo_file_name=logo_file_name,
             )
-            session.add(association)
-            session.flush()
+            self._add_instance(association)
             self._logger.info(
                 f"Created association (Verein): {name} "
                 f"under organisation: {organisation.name}"
@@ -747,7 +776,7 @@ class DbPopulator:
         return "dummy_logo.png"
 
     def _get_or_create_team_membership(
-        self, session: Session, player: Player, team: Team, season: Season
+        self, player: Player, team: Team, season: Season
     ) -> TeamMembership:
         """Get or create a team membership for the player in the given season."""
         # teams are allowed to use players of other teams playing in lower divisions
@@ -758,19 +787,15 @@ class DbPopulator:
         # wrong team (the team playing in the higher division).
 
         # first we check if the player is already part of the team
-        team_membership = (
-            session.query(TeamMembership)
-            .filter_by(player_id=player.id, team_id=team.id, season_id=season.id)
-            .first()
+        team_membership = self._identity_map.get(
+            "team_membership", (player.id, team.id, season.id), TeamMembership
         )
 
         if not team_membership:
             # if player has no team_membership we check if he is already registered to
             # another team in this particular season
-            team_membership = (
-                session.query(TeamMembership)
-                .filter_by(player_id=player.id, season_id=season.id)
-                .first()
+            team_membership = self._identity_map.get(
+                "season_membership", (player.id, season.id), TeamMembership
             )
             if not team_membership:
                 # just now we add the player to the team
@@ -779,8 +804,7 @@ class DbPopulator:
                     team_id=team.id,
                     season_id=season.id,
                 )
-                session.add(team_membership)
-                session.flush()  # Ensure the record is saved to the database
+                self._add_instance(team_membership)
                 self._logger.info(
                     f"Created team membership for {player.name} in team {team.name} "
                     f"for season {season.season_year}"
@@ -793,8 +817,7 @@ class DbPopulator:
                     season_id=season.id,
                     is_borrowed=True,
                 )
-                session.add(team_membership)
-                session.flush()  # Ensure the record is saved to the database
+                self._add_instance(team_membership)
                 self._logger.info(
                     f"Created team membership for *BORROWED* {player.name} "
                     f"in team {team.name} for season {season.season_year}"
@@ -812,10 +835,3 @@ class DbPopulator:
             if enum_value.value == category_name:
                 return enum_value
         raise ValueError(f"Invalid division name: {category_name}")
-
-    def _draws_possible(self, matches_list: list[dict[str, Any]]) -> bool:
-        # Iterate over each match in the list
-        for match in matches_list:
-            if match.get("result") == "1:1":
-                return True
-        return False
@@ -0,0 +1,85 @@
+import hashlib
+from logging import Logger
+from pathlib import Path
+import pickle
+import sqlite3
+import zlib
+
+from scraper.match_report import MatchReport
+
+
+class ExtractionCache:
+    """Persistent cache of extracted match reports.
+
+    Entries are keyed by page id and a hash of the raw HTML, the `MatchReport`
+    is stored as a compressed pickle in SQLite. All entries are dropped when
+    the extractor fingerprint (sanitizer tables, extraction version) changes.
+    """
+
+    def __init__(self, logger: Logger, cache_path: Path, fingerprint: str) -> None:
+        self._logger = logger
+        self._cache_path = cache_path
+        self._fingerprint = fingerprint
+        self._connection: sqlite3.Connection | None = None
+
+    def get(self, page_id: int, content: bytes) -> MatchReport | None:
+        row = (
+            self._get_connection()
+            .execute(
+                "SELECT payload FROM extraction_results "
+                "WHERE page_id = ? AND content_hash = ?",
+                (page_id, self.generate_content_hash(content)),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def put(self, page_id: int, content: bytes, report: MatchReport) -> None:
+        payload = zlib.compress(pickle.dumps(report, protocol=pickle.HIGHEST_PROTOCOL))
+        with self._get_connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO extraction_results "
+                "(page_id, content_hash, payload) VALUES (?, ?, ?)",
+                (page_id, self.generate_content_hash(content), payload),
+            )
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @staticmethod
+    def generate_content_hash(content: bytes) -> bytes:
+        return hashlib.blake2b(content, digest_size=16).digest()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # several extraction workers may write at the same time
+            connection = sqlite3.connect(self._cache_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS extraction_results ("
+                    "page_id INTEGER PRIMARY KEY, "
+                    "content_hash BLOB NOT NULL, "
+                    "payload BLOB NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS cache_info ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+                )
+                row = connection.execute(
+                    "SELECT value FROM cache_info WHERE key = 'fingerprint'"
+                ).fetchone()
+                if row is None or row[0] != self._fingerprint:
+                    self._logger.info("Extractor changed: clearing extraction cache.")
+                    connection.execute("DELETE FROM extraction_results")
+                    connection.execute(
+                        "INSERT OR REPLACE INTO cache_info (key, value) "
+                        "VALUES ('fingerprint', ?)",
+                        (self._fingerprint,),
+                    )
+            self._connection = connection
+        return self._connection
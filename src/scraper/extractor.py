@@ -1,16 +1,24 @@
 from datetime import datetime
+import hashlib
 from logging import Logger
 import re
 from types import MappingProxyType
 from typing import Any, ClassVar, cast
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
+from bs4.element import NavigableString
 
 from scraper.custom_errors import ElementNotFound
+from scraper.match_report import MatchRecord, MatchReport
+from scraper.match_report_index import MatchReportIndexEntry
 from shared.config.settings import Settings
 
 
 class Extractor:
+    # bump whenever the extraction logic changes the extracted data, this
+    # invalidates all cached extraction results
+    EXTRACTION_VERSION = 1
+
     keyword_to_association = MappingProxyType(
         {
             "Aichach": "Speed Ball Team Aichach",
@@ -144,6 +152,25 @@ class Extractor:
         self._logger = logger
         self._settings = settings
 
+    @classmethod
+    def fingerprint(cls) -> str:
+        """Identifies the extraction logic and sanitizer tables in use."""
+        tables = (
+            cls.EXTRACTION_VERSION,
+            sorted(cls.keyword_to_association.items()),
+            sorted(cls.team_name_sanitizer.items()),
+            sorted(cls.division_name_sanitizer.items()),
+            sorted(cls.players_to_remove),
+            sorted(cls.player_name_sanitizer.items()),
+        )
+        return hashlib.blake2b(repr(tables).encode(), digest_size=16).hexdigest()
+
+    def parse_HTML(
+        self, content: bytes | str, parser: str | None = None
+    ) -> BeautifulSoup:
+        """Parses HTML with the configured parser backend (`Settings.HTML_PARSER`)."""
+        return BeautifulSoup(content, parser or self._settings.HTML_PARSER)
+
     def extract_date(self, html: BeautifulSoup) -> datetime:
         small = html.find("small")
         if small:
@@ -160,6 +187,20 @@ class Extractor:
                 return datetime.strptime(date_match.group(), "%d.%m.%Y").year
         raise ElementNotFound("No 'Date' found in <small> tag.")
 
+    def extract_index_entry(
+        self, page_id: int, html: BeautifulSoup
+    ) -> MatchReportIndexEntry:
+        match_date = self.extract_date(html=html)
+        division_name, division_region = self._extract_match_division(html.find("h1"))
+        division_region = self._sanitize_division_name(division_region)
+        return MatchReportIndexEntry(
+            page_id=page_id,
+            date=match_date.date(),
+            season=match_date.year,
+            # some divisions have no region
+            division=" ".join(filter(None, (division_name, division_region))),
+        )
+
     def extract_urls(self, page_type: str, html: BeautifulSoup) -> list[str]:
         pattern = re.compile(
             re.escape(f"{self._settings.BTFV_URL_BASE}/{page_type}/anzeigen/")
@@ -175,22 +216,29 @@ class Extractor:
     def extract_page_id_from_url(self, url: str) -> int:
         return int(url.split("/")[-2])
 
-    def extract_data(self, page_id: int, html: BeautifulSoup) -> None:
-        self.season = self.extract_season_year(html=html)
-        self.page_id = page_id
-        self.html = html
-        self.heading1 = self.html.find("h1")
-        self.meta = self._extract_matchday_metadata()
-        self.home_players = Extractor.extract_players(html=self.html, home=True)
-        self.away_players = Extractor.extract_players(html=self.html, home=False)
-        self.player_map = self._create_player_map(self.home_players + self.away_players)
+    def extract_data(self, page_id: int, html: BeautifulSoup) -> MatchReport:
+        heading1 = html.find("h1")
+        meta = self._extract_matchday_metadata(html=html, heading1=heading1)
+        home_players = Extractor.extract_players(html=html, home=True)
+        away_players = Extractor.extract_players(html=html, home=False)
+        player_map = self._create_player_map(
+            home_players + away_players, page_id=page_id
+        )
         self._logger.debug("Players on this matchday:")
 
-        for abbr, player in self.player_map.items():
+        for abbr, player in player_map.items():
             self._logger.debug(f"{abbr}, {player}")
 
-        self.matches = self._extract_matches(self.player_map)
-        self._logger.info(f"{len(self.matches)} matches found.")
+        matches = self._extract_matches(html=html, player_map=player_map)
+        self._logger.info(f"{len(matches)} matches found.")
+        return MatchReport(
+            page_id=page_id,
+            season=self.extract_season_year(html=html),
+            home_players=tuple(home_players),
+            away_players=tuple(away_players),
+            matches=tuple(matches),
+            **meta,
+        )
 
     @staticmethod
     def extract_players(html: BeautifulSoup, home: bool) -> list[Any]:
@@ -239,7 +287,7 @@ class Extractor:
         team_name = team_name.replace("Muenchen", "München")
         return team_name
 
-    def _create_player_map(self, players: list[str]) -> dict[str, str]:
+    def _create_player_map(self, players: list[str], page_id: int) -> dict[str, str]:
         player_map: dict[str, str] = {}
         for player in players:
             # abbreviate player name
@@ -250,7 +298,7 @@ class Extractor:
                     self._logger.warning(
                         f"Ambiguity found: {player_abbr} -> {player} "
                         f"already exists as: {player_map.get(player_abbr)} "
-                        f"found at {self.page_id}"
+                        f"found at {page_id}"
                     )
             else:
                 # skip invalid player names
@@ -259,11 +307,11 @@ class Extractor:
         return player_map
 
     def _extract_matches(  # noqa: C901
-        self, player_map: dict[str, str]
-    ) -> list[dict[str, str | int]]:
-        matches_list: list[dict[str, str | int]] = []
+        self, html: BeautifulSoup, player_map: dict[str, str]
+    ) -> list[MatchRecord]:
+        matches_list: list[MatchRecord] = []
         pattern = re.compile(r"(einzel|doppel)")
-        tables = self.html.find_all("table", id=pattern)
+        tables = html.find_all("table", id=pattern)
         offset_double = 6
         offset_single = 4
         match_number = 0
@@ -330,18 +378,18 @@ class Extractor:
                         sets_home, sets_away, who_won = self._check_who_won(result)
 
                         matches_list.append(
-                            {
-                                "match_number": match_number,
-                                "match_type": "double",
-                                "who_won": who_won,
-                                "p_home1": p_home1,
-                                "p_home2": p_home2,
-                                "p_away1": p_away1,
-                                "p_away2": p_away2,
-                                "result": result,
-                                "sets_home": sets_home,
-                                "sets_away": sets_away,
-                            }
+                            MatchRecord(
+                                match_number=match_number,
+                                match_type="double",
+                                who_won=who_won,
+                                p_home1=p_home1,
+                                p_home2=p_home2,
+                                p_away1=p_away1,
+                                p_away2=p_away2,
+                                result=result,
+                                sets_home=int(sets_home),
+                                sets_away=int(sets_away),
+                            )
                         )
                 elif "einzel" in table_id:
                     tds = tables[idx].find("tbody").find_all("td")
@@ -381,16 +429,16 @@ class Extractor:
                         sets_home, sets_away, who_won = self._check_who_won(result)
 
                         matches_list.append(
-                            {
-                                "match_number": match_number,
-                                "match_type": "single",
-                                "who_won": who_won,
-                                "p_home1": p_home1,
-                                "p_away2": p_away1,
-                                "result": tds[3 + step].text.strip(),
-                                "sets_home": sets_home,
-                                "sets_away": sets_away,
-                            }
+                            MatchRecord(
+                                match_number=match_number,
+                                match_type="single",
+                                who_won=who_won,
+                                p_home1=p_home1,
+                                p_away1=p_away1,
+                                result=result,
+                                sets_home=int(sets_home),
+                                sets_away=int(sets_away),
+                            )
                         )
         return matches_list
 
@@ -403,8 +451,10 @@ class Extractor:
             who_won = "draw"
         return sets_home, sets_away, who_won
 
-    def _extract_matchday_metadata(self) -> dict[str, object]:
-        division_name, division_region = self._extract_match_division()
+    def _extract_matchday_metadata(
+        self, html: BeautifulSoup, heading1: Tag | NavigableString | None
+    ) -> dict[str, Any]:
+        division_name, division_region = self._extract_match_division(heading1)
         division_region = self._sanitize_division_name(division_region)
         possible_divisions = {
             "Landesliga": 1,
@@ -413,9 +463,9 @@ class Extractor:
             "Kreisliga": 4,
         }
         division_hierarchy = possible_divisions[division_name]
-        matchday = self._extract_match_day()
-        matchdate = self._extract_match_date()
-        home_team, away_team = self._extract_team_names()
+        matchday = self._extract_match_day(heading1)
+        matchdate = self._extract_match_date(heading1)
+        home_team, away_team = self._extract_team_names(html, heading1)
         home_team, away_team = (
             self._sanitize_team_name(home_team),
             self._sanitize_team_name(away_team),
@@ -435,9 +485,11 @@ class Extractor:
         }
         return meta
 
-    def _extract_match_division(self) -> tuple[str, str]:
-        if self.heading1:
-            division = re.search(r"(.*?)(?=\s*Spieltag)", self.heading1.text.strip())
+    def _extract_match_division(
+        self, heading1: Tag | NavigableString | None
+    ) -> tuple[str, str]:
+        if heading1:
+            division = re.search(r"(.*?)(?=\s*Spieltag)", heading1.text.strip())
             if division:
                 pattern = (
                     r"\b(?P<division>Landesliga|Verbandsliga|Bezirksliga|Kreisliga)"
@@ -455,25 +507,27 @@ class Extractor:
                     return match.group("division"), match.group("region")
         raise ElementNotFound("No division name in <h1>-tag.")
 
-    def _extract_match_day(self) -> int:
-        if self.heading1:
-            match_day = re.search(r"(?:.)+(?:Spieltag\s*)(\d+)*", self.heading1.text)
+    def _extract_match_day(self, heading1: Tag | NavigableString | None) -> int:
+        if heading1:
+            match_day = re.search(r"(?:.)+(?:Spieltag\s*)(\d+)*", heading1.text)
             if match_day:
                 return int(match_day.group(1))
         raise ElementNotFound("No matchday in <h1>-tag.")
 
-    def _extract_match_date(self) -> datetime:
-        if self.heading1:
-            match_date = re.search(r"(\d{2})\.(\d{2})\.(\d{4})", self.heading1.text)
+    def _extract_match_date(self, heading1: Tag | NavigableString | None) -> datetime:
+        if heading1:
+            match_date = re.search(r"(\d{2})\.(\d{2})\.(\d{4})", heading1.text)
             if match_date:
                 match_date_str = match_date.group()
                 match_date_obj = datetime.strptime(match_date_str, "%d.%m.%Y")
                 return match_date_obj
         raise ElementNotFound("No matchdate in <h1>-tag.")
 
-    def _extract_team_names(self) -> tuple[str, str]:
-        if self.heading1:
-            h2 = self.html.find_all("h2")
+    def _extract_team_names(
+        self, html: BeautifulSoup, heading1: Tag | NavigableString | None
+    ) -> tuple[str, str]:
+        if heading1:
+            h2 = html.find_all("h2")
             home_team = h2[0].text.strip()
             away_team = h2[2].text.strip()
             return (home_team, away_team)
@@ -1,5 +1,7 @@
 import csv
+import gzip
 import hashlib
+import json
 from logging import Logger
 from pathlib import Path
 import re
@@ -7,6 +9,10 @@ import re
 from bs4 import BeautifulSoup
 from requests import Response
 
+from scraper.html_archive import HtmlArchive
+from scraper.match_report_index import MatchReportIndex, MatchReportIndexEntry
+from scraper.player_lookup_store import PlayerLookupEntry, PlayerLookupStore
+from scraper.player_metadata_store import PlayerMetadata, PlayerMetadataStore
 from shared.config.settings import Settings
 
 
@@ -14,17 +20,173 @@ class FileHandler:
     def __init__(self, logger: Logger, settings: Settings) -> None:
         self._logger = logger
         self._settings = settings
+        self._archive = HtmlArchive(
+            logger=logger, pack_path=settings.MATCH_REPORT_ARCHIVE_FILE
+        )
+        self._match_report_index = MatchReportIndex(
+            logger=logger, index_path=settings.MATCH_REPORT_INDEX_FILE
+        )
+        self._player_lookup_store = PlayerLookupStore(
+            logger=logger,
+            csv_path=settings.DTFB_CSV_FILE,
+            header=settings.DTFB_CSV_HEADER,
+        )
+        self._player_metadata_store = PlayerMetadataStore(
+            logger=logger, store_path=settings.PLAYER_METADATA_FILE
+        )
 
-    def write_HTML(self, HTML: BeautifulSoup, file_path: Path) -> None:
-        with open(file_path, "w", encoding="utf-8") as file:
-            file.write(HTML.prettify())
+    def write_HTML(
+        self,
+        content: bytes,
+        file_path: Path,
+        index_entry: MatchReportIndexEntry | None = None,
+    ) -> None:
+        """Caches the response body exactly as received.
+
+        `file_path` always names the plain `.html` file. With compression enabled
+        the body is stored gzip-compressed as `<file_path>.gz` instead. With the
+        archive enabled match reports are appended to the pack file. The
+        `index_entry` of a match report is added to the match report index.
+        """
+        archive_key = self._generate_archive_key(file_path=file_path)
+        if (
+            self._settings.HTML_CACHE_ARCHIVE
+            and archive_key
+            and archive_key[0] == "spielbericht"
+        ):
+            # match reports never change, season and division pages are rewritten
+            self._archive.append(*archive_key, content=content)
+            file_path = self._settings.MATCH_REPORT_ARCHIVE_FILE
+        elif self._settings.HTML_CACHE_COMPRESSION:
+            compressed_path = self._generate_compressed_path(file_path=file_path)
+            with gzip.open(compressed_path, "wb") as file:
+                file.write(content)
+            # don't leave a stale uncompressed copy behind
+            file_path.unlink(missing_ok=True)
+            file_path = compressed_path
+        else:
+            with open(file_path, "wb") as file:
+                file.write(content)
         self._logger.info(f"HTML written to {file_path}")
 
+        if index_entry is not None:
+            self._match_report_index.add(index_entry)
+
+    def read_raw_HTML(self, file_path: Path) -> bytes:
+        if file_path.exists():
+            with open(file_path, "rb") as file:
+                return file.read()
+        compressed_path = self._generate_compressed_path(file_path=file_path)
+        if compressed_path.exists():
+            with gzip.open(compressed_path) as file:
+                return file.read()
+        archive_key = self._generate_archive_key(file_path=file_path)
+        if archive_key and self._archive.contains(*archive_key):
+            return self._archive.read(*archive_key)
+        raise FileNotFoundError(f"{file_path} is not cached.")
+
     def read_HTML(self, file_path: Path) -> BeautifulSoup:
         self._logger.info(f"Reading HTML from {file_path}")
-        with open(file_path, encoding="utf-8") as file:
-            content = file.read()
-        return BeautifulSoup(content, "html.parser")
+        # BeautifulSoup detects the encoding of the raw bytes itself
+        return BeautifulSoup(
+            self.read_raw_HTML(file_path=file_path), self._settings.HTML_PARSER
+        )
+
+    def _generate_compressed_path(self, file_path: Path) -> Path:
+        return file_path.with_name(f"{file_path.name}.gz")
+
+    def _generate_archive_key(self, file_path: Path) -> tuple[str, int] | None:
+        if file_path.parent != self._settings.MATCH_REPORT_HTML_PATH:
+            return None
+        match = re.fullmatch(r"(saison|liga|spielbericht)_(\d+)\.html", file_path.name)
+        if match:
+            return match.group(1), int(match.group(2))
+        return None
+
+    def pack_cached_HTML(self, remove_loose: bool = False) -> int:
+        """Moves the loose match report files into the archive.
+
+        Returns the number of packed pages. Season and division pages are
+        rewritten on every revalidation and stay loose, like in `write_HTML`.
+        With `remove_loose` a loose file is only deleted if the archive holds
+        exactly the same content.
+        """
+        path = self._settings.MATCH_REPORT_HTML_PATH
+        file_paths = {
+            file_path.with_name(file_path.name.removesuffix(".gz"))
+            for pattern in ("spielbericht_*.html", "spielbericht_*.html.gz")
+            for file_path in path.glob(pattern)
+        }
+        packed = 0
+        for file_path in sorted(file_paths):
+            archive_key = self._generate_archive_key(file_path=file_path)
+            if not archive_key:
+                continue
+            content = self.read_raw_HTML(file_path=file_path)
+            if not self._archive.contains(*archive_key):
+                self._archive.append(*archive_key, content=content)
+                packed += 1
+            if remove_loose:
+                if self._archive.read(*archive_key) != content:
+                    self._logger.warning(
+                        f"{file_path} differs from its archived copy, kept loose."
+                    )
+                    continue
+                file_path.unlink(missing_ok=True)
+                self._generate_compressed_path(file_path=file_path).unlink(
+                    missing_ok=True
+                )
+        self._logger.info(
+            f"{packed} pages packed into {self._settings.MATCH_REPORT_ARCHIVE_FILE}"
+        )
+        return packed
+
+    def get_match_report_index_entry(
+        self, page_id: int
+    ) -> MatchReportIndexEntry | None:
+        return self._match_report_index.get(page_id)
+
+    def add_to_match_report_index(self, index_entry: MatchReportIndexEntry) -> None:
+        self._match_report_index.add(index_entry)
+
+    def get_player_lookup(self, player_name: str) -> PlayerLookupEntry | None:
+        return self._player_lookup_store.get_by_hash(self.generate_hash(player_name))
+
+    def get_player_lookup_by_name(self, player_name: str) -> PlayerLookupEntry | None:
+        return self._player_lookup_store.get_by_name(player_name)
+
+    def add_player_lookup(self, player_name: str, DTFB_from_id: int | None) -> None:
+        self._player_lookup_store.add(
+            PlayerLookupEntry(
+                player_hash=self.generate_hash(player_name),
+                player_name=player_name,
+                DTFB_from_id=DTFB_from_id,
+            )
+        )
+
+    def get_player_metadata(self, player_name: str) -> PlayerMetadata | None:
+        return self._player_metadata_store.get(self.generate_hash(player_name))
+
+    def add_player_metadata(self, metadata: PlayerMetadata) -> None:
+        self._player_metadata_store.add(metadata)
+
+    def read_validators(self, file_path: Path) -> dict[str, str]:
+        """Returns the HTTP validators (ETag, Last-Modified) of a cached page."""
+        validators_path = self._generate_validators_path(file_path=file_path)
+        if not validators_path.exists():
+            return {}
+        with open(validators_path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def write_validators(self, validators: dict[str, str], file_path: Path) -> None:
+        validators_path = self._generate_validators_path(file_path=file_path)
+        with open(validators_path, "w", encoding="utf-8") as file:
+            json.dump(validators, file)
+        self._logger.debug(f"Validators written to {validators_path}")
+
+    def _generate_validators_path(self, file_path: Path) -> Path:
+        # stored next to the HTML file, e.g. `liga_123.html.validators.json`
+        return file_path.with_name(f"{file_path.name}.validators.json")
 
     def append_to_csv(
         self, file_path: Path, data: dict[str, str] | None = None
@@ -90,11 +252,35 @@ class FileHandler:
         return player_hash[:8]
 
     def exists(self, path: Path) -> bool:
-        return True if path.exists() else False
+        if path.exists():
+            return True
+        if self._generate_compressed_path(file_path=path).exists():
+            return True
+        archive_key = self._generate_archive_key(file_path=path)
+        return archive_key is not None and self._archive.contains(*archive_key)
 
     def get_all_cached_match_reports(self) -> list[Path]:
         path = self._settings.MATCH_REPORT_HTML_PATH
-        return list(path.glob("spielbericht_*.html"))
+        file_paths = set(path.glob("spielbericht_*.html"))
+        # compressed and archived pages are referred to by their plain `.html` path
+        file_paths.update(
+            file_path.with_suffix("")
+            for file_path in path.glob("spielbericht_*.html.gz")
+        )
+        file_paths.update(
+            path / f"spielbericht_{page_id}.html"
+            for page_id in self._archive.page_ids("spielbericht")
+        )
+        return sorted(file_paths)
+
+    def get_all_cached_player_pages(self) -> list[Path]:
+        path = self._settings.PLAYER_HTML_PATH
+        file_paths = set(path.glob("*.html"))
+        # compressed pages are referred to by their plain `.html` path
+        file_paths.update(
+            file_path.with_suffix("") for file_path in path.glob("*.html.gz")
+        )
+        return sorted(file_paths)
 
     def extract_page_id_from_path(self, file_path: Path) -> int:
         # Extract the file name from the complete path
@@ -0,0 +1,98 @@
+from collections.abc import Iterator
+from logging import Logger
+import os
+from pathlib import Path
+import struct
+import threading
+import zlib
+
+
+class HtmlArchive:
+    """Append-only pack of compressed HTML pages with an offset index.
+
+    Every page is stored as an individually zlib-compressed record in the pack
+    file. The index file next to it holds one fixed-size entry per record
+    (page type, page id, offset, length), so any page can be read with a single
+    positioned read. Appending a page again supersedes the previous record.
+    """
+
+    PAGE_TYPES = ("saison", "liga", "spielbericht")
+    # page type code, page id, offset, length
+    _INDEX_ENTRY = struct.Struct("<BIQI")
+
+    def __init__(self, logger: Logger, pack_path: Path) -> None:
+        self._logger = logger
+        self._pack_path = pack_path
+        self._index_path = pack_path.with_name(f"{pack_path.name}.idx")
+        self._index: dict[tuple[str, int], tuple[int, int]] | None = None
+        self._read_fd: int | None = None
+        self._lock = threading.Lock()
+
+    def contains(self, page_type: str, page_id: int) -> bool:
+        return (page_type, page_id) in self._get_index()
+
+    def page_ids(self, page_type: str) -> list[int]:
+        return sorted(
+            page_id
+            for indexed_type, page_id in self._get_index()
+            if indexed_type == page_type
+        )
+
+    def read(self, page_type: str, page_id: int) -> bytes:
+        offset, length = self._get_index()[(page_type, page_id)]
+        return zlib.decompress(os.pread(self._get_read_fd(), length, offset))
+
+    def append(self, page_type: str, page_id: int, content: bytes) -> None:
+        record = zlib.compress(content)
+        index = self._get_index()
+        with self._lock:
+            with open(self._pack_path, "ab") as pack:
+                offset = pack.tell()
+                pack.write(record)
+            # the record is complete before it becomes visible in the index
+            with open(self._index_path, "ab") as index_file:
+                index_file.write(
+                    self._INDEX_ENTRY.pack(
+                        self.PAGE_TYPES.index(page_type), page_id, offset, len(record)
+                    )
+                )
+            index[(page_type, page_id)] = (offset, len(record))
+
+    def stream(self, page_type: str | None = None) -> Iterator[tuple[str, int, bytes]]:
+        """Yields `(page_type, page_id, content)` in the order of the pack file."""
+        entries = sorted(
+            (offset, length, key)
+            for key, (offset, length) in self._get_index().items()
+            if page_type is None or key[0] == page_type
+        )
+        with open(self._pack_path, "rb") as pack:
+            for offset, length, (entry_type, page_id) in entries:
+                pack.seek(offset)
+                yield entry_type, page_id, zlib.decompress(pack.read(length))
+
+    def _get_read_fd(self) -> int:
+        if self._read_fd is None:
+            # concurrent readers must not each open a descriptor and leak it
+            with self._lock:
+                if self._read_fd is None:
+                    self._read_fd = os.open(self._pack_path, os.O_RDONLY)
+        return self._read_fd
+
+    def _get_index(self) -> dict[tuple[str, int], tuple[int, int]]:
+        if self._index is None:
+            self._index = self._load_index()
+        return self._index
+
+    def _load_index(self) -> dict[tuple[str, int], tuple[int, int]]:
+        index: dict[tuple[str, int], tuple[int, int]] = {}
+        if not self._index_path.exists():
+            return index
+        data = self._index_path.read_bytes()
+        # ignore a partially written entry at the end of the index
+        usable = len(data) - len(data) % self._INDEX_ENTRY.size
+        for type_code, page_id, offset, length in self._INDEX_ENTRY.iter_unpack(
+            data[:usable]
+        ):
+            index[(self.PAGE_TYPES[type_code], page_id)] = (offset, length)
+        self._logger.info(f"{len(index)} pages indexed in {self._pack_path}")
+        return index
@@ -0,0 +1,89 @@
+from logging import Logger
+import threading
+from types import TracebackType
+from typing import Any, Self
+from urllib.parse import urlparse
+
+import requests
+from requests import Response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from shared.config.settings import Settings
+
+
+class HttpClient:
+    """Shared HTTP client for btfv.de and dtfb.de.
+
+    A single `requests.Session` keeps connections alive and holds one connection
+    pool per host. Transient errors (connection problems, 429 and 5xx responses)
+    are retried with exponential backoff on transport level. Every request uses
+    the configured connect and read timeouts and is subject to a per-host
+    concurrency limit, so parallel crawler workers stay polite.
+    """
+
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, logger: Logger, settings: Settings) -> None:
+        self._logger = logger
+        self._settings = settings
+        self._timeout = (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT)
+
+        retry = Retry(
+            total=settings.HTTP_MAX_RETRIES,
+            backoff_factor=settings.HTTP_BACKOFF_FACTOR,
+            status_forcelist=self.RETRY_STATUS_CODES,
+            # the DTFB player search is a POST without side effects
+            allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=settings.HTTP_POOL_CONNECTIONS,
+            pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+            max_retries=retry,
+        )
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+        # limits concurrent requests per host when crawling with several workers
+        self._host_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._host_slots_lock = threading.Lock()
+
+    def get(self, URL: str, **kwargs: Any) -> Response:
+        return self._request("GET", URL, **kwargs)
+
+    def post(self, URL: str, **kwargs: Any) -> Response:
+        return self._request("POST", URL, **kwargs)
+
+    def close(self) -> None:
+        self._session.close()
+
+    def __enter__(self) -> Self:
+        """Returns the client, `close` is called when the block is left."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Closes the pooled connections, also when the block raised."""
+        self.close()
+
+    def _request(self, method: str, URL: str, **kwargs: Any) -> Response:
+        kwargs.setdefault("timeout", self._timeout)
+        with self._host_slot(URL):
+            self._logger.debug(f"{method} {URL}")
+            return self._session.request(method, URL, **kwargs)
+
+    def _host_slot(self, URL: str) -> threading.BoundedSemaphore:
+        host = urlparse(URL).netloc
+        with self._host_slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(
+                    self._settings.SCRAPER_MAX_REQUESTS_PER_HOST
+                )
+            return self._host_slots[host]
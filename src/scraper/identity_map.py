@@ -0,0 +1,79 @@
+from collections.abc import Callable, Hashable, Sequence
+from logging import Logger
+from typing import Any, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+T = TypeVar("T")
+
+
+class IdentityMap:
+    """Process-lifetime cache of ORM instances by natural key.
+
+    Every index maps the natural key of one model (e.g. player name) to its
+    instance, so get-or-create lookups need no query once the map is warmed.
+    Instances added since the last commit are tracked and evicted on rollback,
+    which keeps the map consistent with the database.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        indexes: dict[str, tuple[type, Callable[[Any], Hashable]]],
+    ) -> None:
+        self._logger = logger
+        self._indexes = indexes
+        self._entries: dict[str, dict[Hashable, Any]] = {name: {} for name in indexes}
+        self._pending: list[tuple[str, Hashable]] = []
+
+    def warm(self, session: Session) -> None:
+        """Loads all instances of the indexed models from the database."""
+        for model in {model for model, _ in self._indexes.values()}:
+            instances: Sequence[Any] = session.scalars(select(model)).all()
+            for instance in instances:
+                self._index(instance, pending=False)
+            self._logger.info(f"{len(instances)} {model.__name__} rows cached.")
+
+    def get(self, index: str, key: Hashable, model: type[T]) -> T | None:
+        return self._entries[index].get(key)
+
+    def values(self, index: str) -> list[Any]:
+        return list(self._entries[index].values())
+
+    def add(self, instance: Any) -> None:
+        """Adds a newly created (and flushed) instance to all of its indexes."""
+        self._index(instance, pending=True)
+
+    def commit(self) -> None:
+        self._pending.clear()
+
+    def savepoint(self) -> int:
+        """Returns a marker to roll back to, e.g. along with a db savepoint."""
+        return len(self._pending)
+
+    def rollback(self, savepoint: int = 0) -> None:
+        """Evicts the instances added since the last commit or `savepoint`."""
+        evicted = self._pending[savepoint:]
+        for index, key in reversed(evicted):
+            self._entries[index].pop(key, None)
+        self._logger.info(f"{len(evicted)} rolled back rows evicted from cache.")
+        del self._pending[savepoint:]
+
+    def clear(self) -> None:
+        for entries in self._entries.values():
+            entries.clear()
+        self._pending.clear()
+
+    def _index(self, instance: Any, pending: bool) -> None:
+        for name, (model, get_key) in self._indexes.items():
+            if not isinstance(instance, model):
+                continue
+            key = get_key(instance)
+            entries = self._entries[name]
+            # keep the first instance for non-unique keys, like `.first()` does
+            if key in entries:
+                continue
+            entries[key] = instance
+            if pending:
+                self._pending.append((name, key))
@@ -0,0 +1,73 @@
+import hashlib
+from io import BytesIO
+from logging import Logger
+from pathlib import Path
+from typing import cast
+
+from PIL import Image, ImageOps
+
+from shared.config.settings import Settings
+from shared.player_images import (
+    PLAYER_IMAGE_VARIANTS,
+    variant_file_name,
+    variant_set_name,
+)
+
+
+class ImageProcessor:
+    """Turns downloaded player images into a deduplicated set of variants.
+
+    Images are stored under the hash of their content, so players sharing the
+    same picture share the files. Every image is normalised to a JPEG original
+    and gets square WebP variants sized for the templates, see
+    `PLAYER_IMAGE_VARIANTS`. The name of the original tells the web app that
+    the variants exist, see `has_variants`.
+    """
+
+    def __init__(self, logger: Logger, settings: Settings) -> None:
+        self._logger = logger
+        self._settings = settings
+
+    def process(self, source_path: Path) -> str:
+        """Creates the variant set of a downloaded image.
+
+        Returns:
+            File name of the original, the name of the variant set.
+        """
+        content = source_path.read_bytes()
+        file_name = variant_set_name(hashlib.sha256(content).hexdigest())
+        if all(
+            (self._settings.PLAYER_IMAGES_PATH / name).exists()
+            for name in [file_name, *self._variant_file_names(file_name)]
+        ):
+            # same picture as an already processed one
+            return file_name
+
+        with Image.open(BytesIO(content)) as image:
+            # returns None only when transposing in place
+            image = cast(Image.Image, ImageOps.exif_transpose(image)).convert("RGB")
+            # variants first, the original is only written for a complete set
+            for variant, size in PLAYER_IMAGE_VARIANTS.items():
+                buffer = BytesIO()
+                ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS).save(
+                    buffer, format="WEBP", quality=80, method=6
+                )
+                self._write(variant_file_name(file_name, variant), buffer.getvalue())
+            buffer = BytesIO()
+            image.save(buffer, format="JPEG", quality=85, optimize=True)
+            self._write(file_name, buffer.getvalue())
+        self._logger.info(f"Image variants of {source_path.name} saved as {file_name}.")
+        return file_name
+
+    def _variant_file_names(self, file_name: str) -> list[str]:
+        return [
+            variant_file_name(file_name, variant) for variant in PLAYER_IMAGE_VARIANTS
+        ]
+
+    def _write(self, file_name: str, content: bytes) -> None:
+        path = self._settings.PLAYER_IMAGES_PATH / file_name
+        if not path.exists():
+            # write and rename, web workers must never serve a partial image
+            temporary_path = path.with_name(f".{file_name}.tmp")
+            temporary_path.write_bytes(content)
+            temporary_path.replace(path)
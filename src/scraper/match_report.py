@@ -0,0 +1,39 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass(frozen=True, slots=True)
+class MatchRecord:
+    """A single or double match of a match report."""
+
+    match_number: int
+    match_type: str  # 'single', 'double'
+    who_won: str  # 'home', 'away', 'draw'
+    p_home1: str
+    p_away1: str
+    result: str
+    sets_home: int
+    sets_away: int
+    # second players, doubles only
+    p_home2: str | None = None
+    p_away2: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class MatchReport:
+    """Everything extracted from one match report (Spielbericht)."""
+
+    page_id: int
+    season: int
+    division_name: str
+    division_region: str
+    division_hierarchy: int
+    matchday: int
+    matchdate: datetime
+    home_team: str
+    away_team: str
+    association_home_team: str
+    association_away_team: str
+    home_players: tuple[str, ...]
+    away_players: tuple[str, ...]
+    matches: tuple[MatchRecord, ...]
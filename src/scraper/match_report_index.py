@@ -0,0 +1,65 @@
+from dataclasses import asdict, dataclass
+from datetime import date
+import json
+from logging import Logger
+from pathlib import Path
+import threading
+
+
+@dataclass(frozen=True, slots=True)
+class MatchReportIndexEntry:
+    page_id: int
+    date: date
+    season: int
+    division: str
+
+
+class MatchReportIndex:
+    """Persistent index of cached match reports: page id -> date, season, division.
+
+    The index is an append-only JSON lines journal, the last entry of a page id
+    wins. It allows sorting all cached match reports without opening any HTML.
+    """
+
+    def __init__(self, logger: Logger, index_path: Path) -> None:
+        self._logger = logger
+        self._index_path = index_path
+        self._entries: dict[int, MatchReportIndexEntry] | None = None
+        self._lock = threading.Lock()
+
+    def get(self, page_id: int) -> MatchReportIndexEntry | None:
+        return self._get_entries().get(page_id)
+
+    def add(self, entry: MatchReportIndexEntry) -> None:
+        entries = self._get_entries()
+        line = json.dumps(asdict(entry) | {"date": entry.date.isoformat()})
+        with self._lock:
+            with open(self._index_path, "a", encoding="utf-8") as file:
+                file.write(f"{line}\n")
+            entries[entry.page_id] = entry
+
+    def _get_entries(self) -> dict[int, MatchReportIndexEntry]:
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def _load(self) -> dict[int, MatchReportIndexEntry]:
+        entries: dict[int, MatchReportIndexEntry] = {}
+        if not self._index_path.exists():
+            return entries
+        with open(self._index_path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    # skip a partially written last line
+                    continue
+                entry = MatchReportIndexEntry(
+                    page_id=row["page_id"],
+                    date=date.fromisoformat(row["date"]),
+                    season=row["season"],
+                    division=row["division"],
+                )
+                entries[entry.page_id] = entry
+        self._logger.info(f"{len(entries)} match reports in {self._index_path}")
+        return entries
@@ -0,0 +1,213 @@
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from logging import Logger
+import queue
+import threading
+import time
+from typing import Any
+
+from bs4 import BeautifulSoup
+
+from scraper.file_handler import FileHandler
+from scraper.player_metadata_backfill import PlayerMetadataBackfill
+from scraper.scraper import PlayerScraper
+from shared.config.settings import Settings
+
+# tells the workers of a stage that no more items follow
+_STOP = object()
+
+
+@dataclass(frozen=True, slots=True)
+class _PlayerDetails:
+    player_name: str
+    DTFB_from_id: int
+    player_url: str
+
+
+@dataclass(frozen=True, slots=True)
+class _PlayerImage:
+    player_name: str
+    image_url: str
+
+
+class PlayerEnrichment:
+    """Looks up many players on the DTFB website concurrently.
+
+    Search, details page and image download run as stages with their own
+    worker threads, connected by bounded queues. Every player is looked up
+    once, players with cached details or an earlier lookup are skipped. All
+    requests share a minimum interval on top of the per-host limit of the
+    `HttpClient`.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        settings: Settings,
+        file_handler: FileHandler,
+        player_scraper: PlayerScraper,
+        player_metadata_backfill: PlayerMetadataBackfill,
+    ) -> None:
+        self._logger = logger
+        self._settings = settings
+        self._file_handler = file_handler
+        self._player_scraper = player_scraper
+        self._player_metadata_backfill = player_metadata_backfill
+        self._request_lock = threading.Lock()
+        self._next_request = 0.0
+        self._counts_lock = threading.Lock()
+        self._counts: dict[str, int] = {}
+        self._found_player_names: list[str] = []
+
+    def run(self, player_names: Iterable[str]) -> dict[str, int]:
+        """Fetches the details and images of all players not looked up yet.
+
+        Returns:
+            Number of players searched and found, images downloaded and errors.
+        """
+        self._counts = dict.fromkeys(("searched", "found", "images", "errors"), 0)
+        self._found_player_names = []
+        start = time.perf_counter()
+        search_queue, details_queue, image_queue = (
+            queue.Queue[Any](maxsize=self._settings.ENRICHMENT_QUEUE_SIZE)
+            for _ in range(3)
+        )
+        # the inbox of each stage with its workers
+        stages = [
+            (
+                search_queue,
+                self._start_workers(
+                    self._search,
+                    search_queue,
+                    details_queue,
+                    self._settings.ENRICHMENT_SEARCH_WORKERS,
+                ),
+            ),
+            (
+                details_queue,
+                self._start_workers(
+                    self._fetch_details,
+                    details_queue,
+                    image_queue,
+                    self._settings.ENRICHMENT_DETAIL_WORKERS,
+                ),
+            ),
+            (
+                image_queue,
+                self._start_workers(
+                    self._download_image,
+                    image_queue,
+                    None,
+                    self._settings.ENRICHMENT_IMAGE_WORKERS,
+                ),
+            ),
+        ]
+
+        # names are normalised by the player hash, like the cached files
+        seen: set[str] = set()
+        for player_name in player_names:
+            player_hash = self._file_handler.generate_hash(string=player_name)
+            if player_hash in seen:
+                continue
+            seen.add(player_hash)
+            if not self._player_scraper.is_player_known(player_name=player_name):
+                search_queue.put(player_name)
+
+        # a stage is done once the stage before it has finished
+        for inbox, threads in stages:
+            for _ in threads:
+                inbox.put(_STOP)
+            for thread in threads:
+                thread.join()
+
+        # metadata and player rows are updated once the images are downloaded
+        self._player_metadata_backfill.enqueue(self._found_player_names)
+        self._logger.info(
+            f"Player enrichment of {len(seen)} players "
+            f"in {time.perf_counter() - start:.1f}s: {self._counts}"
+        )
+        return self._counts
+
+    def _start_workers(
+        self,
+        handle: Callable[[Any], Any],
+        inbox: queue.Queue[Any],
+        outbox: queue.Queue[Any] | None,
+        worker_count: int,
+    ) -> list[threading.Thread]:
+        threads = [
+            threading.Thread(
+                target=self._work,
+                args=(handle, inbox, outbox),
+                name=f"enrichment-{handle.__name__.lstrip('_')}-{i}",
+                daemon=True,
+            )
+            for i in range(max(worker_count, 1))
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _work(
+        self,
+        handle: Callable[[Any], Any],
+        inbox: queue.Queue[Any],
+        outbox: queue.Queue[Any] | None,
+    ) -> None:
+        while (item := inbox.get()) is not _STOP:
+            try:
+                result = handle(item)
+            except Exception as e:
+                # a failing player must not stop the pipeline
+                self._logger.error(f"Player enrichment failed for {item}: {e!s}")
+                self._count("errors")
+                continue
+            if result is not None and outbox is not None:
+                outbox.put(result)
+
+    def _search(self, player_name: str) -> _PlayerDetails | None:
+        self._wait_for_request_slot()
+        search_result = self._player_scraper.search_player(player_name=player_name)
+        self._count("searched")
+        if search_result is None:
+            return None
+        DTFB_from_id, player_url = search_result
+        return _PlayerDetails(player_name, DTFB_from_id, player_url)
+
+    def _fetch_details(self, details: _PlayerDetails) -> _PlayerImage | None:
+        self._wait_for_request_slot()
+        html: BeautifulSoup = self._player_scraper.fetch_player_details(
+            player_name=details.player_name,
+            DTFB_from_id=details.DTFB_from_id,
+            player_url=details.player_url,
+        )
+        self._count("found")
+        with self._counts_lock:
+            self._found_player_names.append(details.player_name)
+        image_url = self._player_scraper.find_image_url(html=html)
+        if image_url is None:
+            return None
+        return _PlayerImage(details.player_name, image_url)
+
+    def _download_image(self, image: _PlayerImage) -> None:
+        self._wait_for_request_slot()
+        self._player_scraper.download_image(
+            image_url=image.image_url, player_name=image.player_name
+        )
+        self._count("images")
+
+    def _wait_for_request_slot(self) -> None:
+        """Keeps `ENRICHMENT_REQUEST_INTERVAL` between the starts of requests."""
+        with self._request_lock:
+            now = time.monotonic()
+            wait = self._next_request - now
+            self._next_request = (
+                max(now, self._next_request)
+                + self._settings.ENRICHMENT_REQUEST_INTERVAL
+            )
+        if wait > 0:
+            time.sleep(wait)
+
+    def _count(self, key: str) -> None:
+        with self._counts_lock:
+            self._counts[key] += 1
@@ -0,0 +1,102 @@
+import csv
+from dataclasses import dataclass
+import fcntl
+from logging import Logger
+from pathlib import Path
+import threading
+
+
+@dataclass(frozen=True, slots=True)
+class PlayerLookupEntry:
+    player_hash: str
+    player_name: str
+    # None: looked up on the DTFB website without success
+    DTFB_from_id: int | None
+
+
+class PlayerLookupStore:
+    """Results of the DTFB player lookups, indexed by player hash and name.
+
+    The CSV file is an append-only journal, the last entry of a player wins.
+    It is read once per process, appends are serialised by a thread lock and an
+    exclusive file lock, so parallel scraper workers can share the file.
+    Entries appended by other processes are picked up on a lookup miss.
+    """
+
+    def __init__(self, logger: Logger, csv_path: Path, header: list[str]) -> None:
+        self._logger = logger
+        self._csv_path = csv_path
+        self._header = header
+        self._by_hash: dict[str, PlayerLookupEntry] = {}
+        self._by_name: dict[str, PlayerLookupEntry] = {}
+        # bytes of the journal read so far
+        self._offset = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get_by_hash(self, player_hash: str) -> PlayerLookupEntry | None:
+        return self._get(self._by_hash, player_hash)
+
+    def get_by_name(self, player_name: str) -> PlayerLookupEntry | None:
+        return self._get(self._by_name, player_name)
+
+    def add(self, entry: PlayerLookupEntry) -> None:
+        row = {
+            "player_hash": entry.player_hash,
+            "DTFB_from_id": "" if entry.DTFB_from_id is None else entry.DTFB_from_id,
+            "player_name": entry.player_name,
+        }
+        with self._lock:
+            with open(self._csv_path, "a", newline="", encoding="utf-8") as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                try:
+                    writer = csv.DictWriter(
+                        file, fieldnames=self._header, delimiter=";"
+                    )
+                    if file.tell() == 0:
+                        self._logger.info(f"{self._csv_path} created")
+                        writer.writeheader()
+                    writer.writerow(row)
+                    file.flush()
+                finally:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+            self._index(entry)
+        self._logger.info(f"Written player data to {self._csv_path}")
+
+    def _get(
+        self, entries: dict[str, PlayerLookupEntry], key: str
+    ) -> PlayerLookupEntry | None:
+        if not self._loaded or key not in entries:
+            with self._lock:
+                self._read_new_rows()
+        return entries.get(key)
+
+    def _read_new_rows(self) -> None:
+        if self._csv_path.exists():
+            with open(self._csv_path, "rb") as file:
+                file.seek(self._offset)
+                data = file.read()
+            # a concurrent writer may not have finished its last line
+            end = data.rfind(b"\n") + 1
+            self._offset += end
+            lines = data[:end].decode("utf-8").splitlines()
+            for row in csv.DictReader(lines, fieldnames=self._header, delimiter=";"):
+                if row["player_hash"] == "player_hash" or row["player_name"] is None:
+                    # header or malformed row
+                    continue
+                self._index(
+                    PlayerLookupEntry(
+                        player_hash=row["player_hash"],
+                        player_name=row["player_name"],
+                        DTFB_from_id=int(row["DTFB_from_id"])
+                        if row["DTFB_from_id"]
+                        else None,
+                    )
+                )
+        if not self._loaded:
+            self._loaded = True
+            self._logger.info(f"{len(self._by_hash)} players in {self._csv_path}")
+
+    def _index(self, entry: PlayerLookupEntry) -> None:
+        self._by_hash[entry.player_hash] = entry
+        self._by_name[entry.player_name] = entry
@@ -0,0 +1,138 @@
+from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from logging import Logger
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import update
+
+from scraper.extractor import Extractor
+from scraper.file_handler import FileHandler
+from scraper.image_processor import ImageProcessor
+from scraper.player_metadata_store import PlayerMetadata
+from shared.database.database import Database
+from shared.database.models import Player, PlayerCategory
+
+# used for players without a cached image
+PLACEHOLDER_IMAGES = {
+    PlayerCategory.HERREN: "dummy_avatar_mann.png",
+    PlayerCategory.DAMEN: "dummy_avatar_frau.png",
+}
+DEFAULT_PLACEHOLDER_IMAGE = "dummy_avatar_binary.jpg"
+
+
+class PlayerMetadataBackfill:
+    """Resolves player metadata from the cached DTFB pages off the ingest path.
+
+    `resolve` extracts category and ids from the cached player page, processes
+    the downloaded image into its variant set and stores both in the player
+    metadata table. `enqueue` does the same in a background thread and updates
+    the player rows afterwards, so match ingestion never waits for player pages
+    to be parsed.
+    """
+
+    def __init__(
+        self,
+        logger: Logger,
+        extractor: Extractor,
+        file_handler: FileHandler,
+        image_processor: ImageProcessor,
+        database: Database,
+    ) -> None:
+        self._logger = logger
+        self._extractor = extractor
+        self._file_handler = file_handler
+        self._image_processor = image_processor
+        self._database = database
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="metadata-backfill"
+        )
+        self._futures: list[Future[None]] = []
+
+    @staticmethod
+    def get_player_values(metadata: PlayerMetadata | None) -> dict[str, Any]:
+        """Returns the `Player` column values, defaults for unknown players."""
+        category = PlayerCategory.UNBEKANNT
+        if metadata and metadata.category:
+            category = PlayerCategory(metadata.category)
+        image_file_name = metadata.image_file_name if metadata else None
+        return {
+            "category": category,
+            "national_id": metadata.national_id if metadata else None,
+            "international_id": metadata.international_id if metadata else None,
+            # store filename only, not path
+            "image_file_name": image_file_name
+            or PLACEHOLDER_IMAGES.get(category, DEFAULT_PLACEHOLDER_IMAGE),
+        }
+
+    def resolve(self, player_name: str) -> PlayerMetadata | None:
+        """Extracts and stores the metadata of a player, None if nothing is cached."""
+        html_path = self._file_handler.generate_path_for_player_html(
+            player_name=player_name
+        )
+        image_path = self._file_handler.generate_path_for_player_image(
+            player_name=player_name
+        )
+        has_html = self._file_handler.exists(html_path)
+        has_image = self._file_handler.exists(image_path)
+        if not has_html and not has_image:
+            return None
+
+        player_info: dict[str, str | None] = {}
+        if has_html:
+            player_info = self._extractor.extract_DTFB_player_information(
+                player_html=self._file_handler.read_HTML(file_path=html_path),
+                player_name=player_name,
+            )
+        metadata = PlayerMetadata(
+            player_hash=self._file_handler.generate_hash(string=player_name),
+            player_name=player_name,
+            category=player_info.get("category") or None,
+            national_id=player_info.get("national_id"),
+            international_id=player_info.get("international_id"),
+            image_file_name=self._process_image(image_path) if has_image else None,
+        )
+        self._file_handler.add_player_metadata(metadata)
+        return metadata
+
+    def _process_image(self, image_path: Path) -> str:
+        try:
+            return self._image_processor.process(image_path)
+        except Exception as e:
+            # the downloaded file is still a usable image for most browsers
+            self._logger.error(f"Processing {image_path.name} failed: {e!s}")
+            return image_path.name
+
+    def enqueue(self, player_names: Iterable[str]) -> None:
+        """Resolves the players in the background and updates their rows."""
+        player_names = sorted(player_names)
+        if player_names:
+            self._futures = [future for future in self._futures if not future.done()]
+            self._futures.append(self._executor.submit(self._backfill, player_names))
+
+    def join(self) -> None:
+        """Waits until all enqueued players are back-filled."""
+        wait(self._futures)
+        self._futures.clear()
+
+    def _backfill(self, player_names: list[str]) -> None:
+        updated = 0
+        for player_name in player_names:
+            try:
+                metadata = self.resolve(player_name)
+                if metadata is None:
+                    continue
+                # one short transaction per player, the ingestion may hold locks
+                with self._database.get_sync_session() as session:
+                    result = session.execute(
+                        update(Player)
+                        .where(Player.name == player_name)
+                        .values(**self.get_player_values(metadata))
+                    )
+                    session.commit()
+                updated += result.rowcount  # type: ignore[attr-defined]
+            except Exception as e:
+                self._logger.error(f"Metadata backfill failed for {player_name}: {e!s}")
+        self._logger.info(
+            f"Metadata of {updated} of {len(player_names)} players back-filled."
+        )
@@ -0,0 +1,65 @@
+from dataclasses import asdict, dataclass
+import json
+from logging import Logger
+from pathlib import Path
+import threading
+
+
+@dataclass(frozen=True, slots=True)
+class PlayerMetadata:
+    player_hash: str
+    player_name: str
+    # `PlayerCategory` value, None if unknown
+    category: str | None
+    national_id: str | None
+    international_id: str | None
+    # None: no image cached, the placeholder of the category is used
+    image_file_name: str | None
+
+
+class PlayerMetadataStore:
+    """Persistent lookup table of enriched player metadata by player hash.
+
+    The table is an append-only JSON lines journal, the last entry of a player
+    wins. It is filled by the enrichment and read by the match ingestion, which
+    needs no player HTML this way.
+    """
+
+    def __init__(self, logger: Logger, store_path: Path) -> None:
+        self._logger = logger
+        self._store_path = store_path
+        self._entries: dict[str, PlayerMetadata] | None = None
+        self._lock = threading.Lock()
+
+    def get(self, player_hash: str) -> PlayerMetadata | None:
+        return self._get_entries().get(player_hash)
+
+    def add(self, entry: PlayerMetadata) -> None:
+        entries = self._get_entries()
+        line = json.dumps(asdict(entry), ensure_ascii=False)
+        with self._lock:
+            with open(self._store_path, "a", encoding="utf-8") as file:
+                file.write(f"{line}\n")
+            entries[entry.player_hash] = entry
+
+    def _get_entries(self) -> dict[str, PlayerMetadata]:
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._load()
+        return self._entries
+
+    def _load(self) -> dict[str, PlayerMetadata]:
+        entries: dict[str, PlayerMetadata] = {}
+        if not self._store_path.exists():
+            return entries
+        with open(self._store_path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = PlayerMetadata(**json.loads(line))
+                except (json.JSONDecodeError, TypeError):
+                    # skip a partially written last line
+                    continue
+                entries[entry.player_hash] = entry
+        self._logger.info(f"{len(entries)} players in {self._store_path}")
+        return entries
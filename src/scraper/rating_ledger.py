@@ -0,0 +1,252 @@
+from array import array
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+
+import trueskill  # type: ignore
+
+from scraper.match_report import MatchRecord, MatchReport
+from scraper.skill_calc import SkillCalc
+
+COMBINED, SINGLES, DOUBLES = 0, 1, 2
+
+
+@dataclass(frozen=True, slots=True)
+class RatedParticipant:
+    """Ratings of one participant before and after a match.
+
+    The fields match the rating columns of `MatchParticipant`. The kind a
+    match was not rated in has no before values, its after values carry the
+    current rating of the player.
+    """
+
+    player_name: str
+    team_side: str  # 'home', 'away'
+    mu_before_combined: float
+    sigma_before_combined: float
+    mu_after_combined: float
+    sigma_after_combined: float
+    mu_before_singles: float | None
+    sigma_before_singles: float | None
+    mu_after_singles: float
+    sigma_after_singles: float
+    mu_before_doubles: float | None
+    sigma_before_doubles: float | None
+    mu_after_doubles: float
+    sigma_after_doubles: float
+
+
+@dataclass(frozen=True, slots=True)
+class RatedMatch:
+    """A match with its outcome probabilities and rated participants."""
+
+    report: MatchReport
+    match: MatchRecord
+    draw_probability: float
+    win_probability: float
+    # home1, away1 and for doubles home2, away2
+    participants: tuple[RatedParticipant, ...]
+
+
+class RatingLedger:
+    """Running TrueSkill ratings of all players, decoupled from the ORM.
+
+    Mu and sigma of the combined, singles and doubles ratings are kept in
+    compact arrays indexed by a dense player index. Replaying chronologically
+    sorted match reports updates the ratings in memory and yields the before
+    and after values of every participant.
+    """
+
+    def __init__(self, mu: float = 25.0, sigma: float = 8.0) -> None:
+        # initial rating of new players
+        self.mu = mu
+        self.sigma = sigma
+        self._player_indexes: dict[str, int] = {}
+        self._mu = (array("d"), array("d"), array("d"))
+        self._sigma = (array("d"), array("d"), array("d"))
+
+    @property
+    def player_count(self) -> int:
+        return len(self._player_indexes)
+
+    def player_index(self, player_name: str) -> int:
+        """Returns the index of a player, new players start with the seed rating."""
+        index = self._player_indexes.get(player_name)
+        if index is None:
+            index = len(self._player_indexes)
+            self._player_indexes[player_name] = index
+            for kind in (COMBINED, SINGLES, DOUBLES):
+                self._mu[kind].append(self.mu)
+                self._sigma[kind].append(self.sigma)
+        return index
+
+    def get_rating(self, player_name: str, kind: int) -> tuple[float, float]:
+        index = self.player_index(player_name)
+        return self._mu[kind][index], self._sigma[kind][index]
+
+    def set_rating(self, player_name: str, kind: int, mu: float, sigma: float) -> None:
+        index = self.player_index(player_name)
+        self._mu[kind][index] = mu
+        self._sigma[kind][index] = sigma
+
+    def replay(self, reports: Iterable[MatchReport]) -> Iterator[RatedMatch]:
+        """Rates the matches of chronologically sorted match reports."""
+        for report in reports:
+            yield from self.replay_report(report)
+
+    def replay_report(self, report: MatchReport) -> list[RatedMatch]:
+        # draws only exist in doubles of some seasons
+        skill_calc_single = SkillCalc.for_draw_probability(0.0)
+        skill_calc_double = SkillCalc.for_draw_probability(
+            0.2 if any(match.result == "1:1" for match in report.matches) else 0.0
+        )
+        rated_matches = []
+        for match in report.matches:
+            if match.match_type == "single":
+                rated_match = self._rate_single(skill_calc_single, report, match)
+            else:
+                rated_match = self._rate_double(skill_calc_double, report, match)
+            rated_matches.append(rated_match)
+        return rated_matches
+
+    def _get(self, skill_calc: SkillCalc, kind: int, index: int) -> trueskill.Rating:
+        return skill_calc.create_rating(
+            mu=self._mu[kind][index], sigma=self._sigma[kind][index]
+        )
+
+    def _set(self, kind: int, index: int, rating: trueskill.Rating) -> None:
+        self._mu[kind][index] = rating.mu
+        self._sigma[kind][index] = rating.sigma
+
+    def _rate_single(
+        self, skill_calc: SkillCalc, report: MatchReport, match: MatchRecord
+    ) -> RatedMatch:
+        home = self.player_index(match.p_home1)
+        away = self.player_index(match.p_away1)
+        # draws count as a win of the away player
+        winner = "player1" if match.who_won == "home" else "player2"
+
+        home_before_combined = self._get(skill_calc, COMBINED, home)
+        away_before_combined = self._get(skill_calc, COMBINED, away)
+        home_before_singles = self._get(skill_calc, SINGLES, home)
+        away_before_singles = self._get(skill_calc, SINGLES, away)
+
+        home_after_combined, away_after_combined = skill_calc.rate_single_match(
+            home_before_combined, away_before_combined, winner=winner
+        )
+        home_after_singles, away_after_singles = skill_calc.rate_single_match(
+            home_before_singles, away_before_singles, winner=winner
+        )
+        self._set(COMBINED, home, home_after_combined)
+        self._set(COMBINED, away, away_after_combined)
+        self._set(SINGLES, home, home_after_singles)
+        self._set(SINGLES, away, away_after_singles)
+
+        draw_probability, win_probability = skill_calc.match_probabilities(
+            [home_before_singles], [away_before_singles]
+        )
+        return RatedMatch(
+            report=report,
+            match=match,
+            draw_probability=draw_probability,
+            win_probability=win_probability,
+            participants=(
+                self._create_participant(
+                    match.p_home1,
+                    "home",
+                    (home_before_combined, home_after_combined),
+                    singles=(home_before_singles, home_after_singles),
+                ),
+                self._create_participant(
+                    match.p_away1,
+                    "away",
+                    (away_before_combined, away_after_combined),
+                    singles=(away_before_singles, away_after_singles),
+                ),
+            ),
+        )
+
+    def _rate_double(
+        self, skill_calc: SkillCalc, report: MatchReport, match: MatchRecord
+    ) -> RatedMatch:
+        player_names = (
+            match.p_home1,
+            str(match.p_home2),
+            match.p_away1,
+            str(match.p_away2),
+        )
+        home1, home2, away1, away2 = map(self.player_index, player_names)
+        # draws count as a win of the away team
+        winner = "team1" if match.who_won == "home" else "team2"
+
+        before_combined = [
+            self._get(skill_calc, COMBINED, index)
+            for index in (home1, home2, away1, away2)
+        ]
+        before_doubles = [
+            self._get(skill_calc, DOUBLES, index)
+            for index in (home1, home2, away1, away2)
+        ]
+        home_after_combined, away_after_combined = skill_calc.rate_double_match(
+            before_combined[:2], before_combined[2:], winner=winner
+        )
+        home_after_doubles, away_after_doubles = skill_calc.rate_double_match(
+            before_doubles[:2], before_doubles[2:], winner=winner
+        )
+        after_combined = [*home_after_combined, *away_after_combined]
+        after_doubles = [*home_after_doubles, *away_after_doubles]
+        for position, index in enumerate((home1, home2, away1, away2)):
+            self._set(COMBINED, index, after_combined[position])
+            self._set(DOUBLES, index, after_doubles[position])
+
+        participants = tuple(
+            self._create_participant(
+                player_names[position],
+                "home" if position < 2 else "away",
+                (before_combined[position], after_combined[position]),
+                doubles=(before_doubles[position], after_doubles[position]),
+            )
+            # home1, away1, home2, away2
+            for position in (0, 2, 1, 3)
+        )
+        draw_probability, win_probability = skill_calc.match_probabilities(
+            before_doubles[:2], before_doubles[2:]
+        )
+        return RatedMatch(
+            report=report,
+            match=match,
+            draw_probability=draw_probability,
+            win_probability=win_probability,
+            participants=participants,
+        )
+
+    def _create_participant(
+        self,
+        player_name: str,
+        team_side: str,
+        combined: tuple[trueskill.Rating, trueskill.Rating],
+        singles: tuple[trueskill.Rating, trueskill.Rating] | None = None,
+        doubles: tuple[trueskill.Rating, trueskill.Rating] | None = None,
+    ) -> RatedParticipant:
+        index = self._player_indexes[player_name]
+        return RatedParticipant(
+            player_name=player_name,
+            team_side=team_side,
+            mu_before_combined=combined[0].mu,
+            sigma_before_combined=combined[0].sigma,
+            mu_after_combined=combined[1].mu,
+            sigma_after_combined=combined[1].sigma,
+            mu_before_singles=singles[0].mu if singles else None,
+            sigma_before_singles=singles[0].sigma if singles else None,
+            # the current singles rating when not rated in singles
+            mu_after_singles=singles[1].mu if singles else self._mu[SINGLES][index],
+            sigma_after_singles=singles[1].sigma
+            if singles
+            else self._sigma[SINGLES][index],
+            mu_before_doubles=doubles[0].mu if doubles else None,
+            sigma_before_doubles=doubles[0].sigma if doubles else None,
+            # the current doubles rating when not rated in doubles
+            mu_after_doubles=doubles[1].mu if doubles else self._mu[DOUBLES][index],
+            sigma_after_doubles=doubles[1].sigma
+            if doubles
+            else self._sigma[DOUBLES][index],
+        )
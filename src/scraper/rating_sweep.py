@@ -0,0 +1,274 @@
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import astuple, dataclass, fields
+import itertools
+from logging import Logger
+import math
+import time
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy import special
+
+from scraper.match_report import MatchReport
+from scraper.skill_calc import FloatArray
+
+_LOG_SQRT_2PI = 0.5 * math.log(2 * math.pi)
+# keeps the log-loss of certain but wrong predictions finite
+_EPSILON = 1e-15
+
+
+@dataclass(frozen=True, slots=True)
+class SweepConfig:
+    """Rating parameters of one replay, the defaults match production."""
+
+    # initial rating of new players
+    mu: float = 25.0
+    sigma: float = 8.0
+    beta: float = 4.1667
+    tau: float = 0.083333
+    # used for doubles of match reports with draws
+    doubles_draw_probability: float = 0.2
+
+
+@dataclass(frozen=True, slots=True)
+class SweepResult:
+    config: SweepConfig
+    match_count: int
+    # of the singles or doubles win probability of the home side
+    log_loss: float
+    accuracy: float
+
+
+@dataclass(frozen=True, slots=True)
+class MatchStream:
+    """Chronological matches as compact arrays, extracted once per sweep.
+
+    Players are referenced by a dense index. Singles have `-1` as second
+    player of both sides.
+    """
+
+    home: NDArray[np.int32]  # (matches, 2)
+    away: NDArray[np.int32]  # (matches, 2)
+    is_double: NDArray[np.bool_]
+    home_won: NDArray[np.bool_]
+    # the match report has draws, see `RatingLedger.replay_report`
+    draws_possible: NDArray[np.bool_]
+    player_count: int
+
+    @property
+    def match_count(self) -> int:
+        return len(self.home_won)
+
+    @classmethod
+    def from_reports(cls, reports: Iterable[MatchReport]) -> "MatchStream":
+        player_indexes: dict[str, int] = {}
+
+        def index(player_name: str) -> int:
+            return player_indexes.setdefault(player_name, len(player_indexes))
+
+        home, away, is_double, home_won, draws_possible = [], [], [], [], []
+        for report in reports:
+            has_draws = any(match.result == "1:1" for match in report.matches)
+            for match in report.matches:
+                double = match.match_type != "single"
+                home.append(
+                    (
+                        index(match.p_home1),
+                        index(str(match.p_home2)) if double else -1,
+                    )
+                )
+                away.append(
+                    (
+                        index(match.p_away1),
+                        index(str(match.p_away2)) if double else -1,
+                    )
+                )
+                is_double.append(double)
+                # draws count as a win of the away side
+                home_won.append(match.who_won == "home")
+                draws_possible.append(has_draws)
+        return cls(
+            home=np.array(home, dtype=np.int32).reshape(-1, 2),
+            away=np.array(away, dtype=np.int32).reshape(-1, 2),
+            is_double=np.array(is_double, dtype=np.bool_),
+            home_won=np.array(home_won, dtype=np.bool_),
+            draws_possible=np.array(draws_possible, dtype=np.bool_),
+            player_count=len(player_indexes),
+        )
+
+
+def parameter_grid(**values: Sequence[float]) -> list[SweepConfig]:
+    """Returns the configurations of all combinations of the given values.
+
+    Example:
+        `parameter_grid(beta=[3.0, 4.1667], tau=[0.05, 0.083333])`
+    """
+    names = [field.name for field in fields(SweepConfig) if field.name in values]
+    return [
+        SweepConfig(**dict(zip(names, combination, strict=True)))
+        for combination in itertools.product(*(values[name] for name in names))
+    ]
+
+
+def replay(stream: MatchStream, configs: Sequence[SweepConfig]) -> list[SweepResult]:
+    """Replays the match stream under all configurations at once.
+
+    Matches depend on each other and are replayed in order, the configurations
+    are independent and form the vectorised axis. Ratings are updated like
+    `RatingLedger`, the home win probability is predicted from the singles or
+    doubles ratings before each match.
+    """
+    # one column per parameter, (configs, 1) broadcasts against (configs, players)
+    parameters = np.array([astuple(config) for config in configs], dtype=np.float64)
+    mu, sigma, beta, tau, draw_probability = np.hsplit(parameters, parameters.shape[1])
+    beta2 = beta[:, 0] ** 2
+    tau2 = tau**2
+    no_draw_margin = np.zeros(len(configs))
+    # draw margin of doubles with draws, four players
+    draw_margin = special.ndtri((draw_probability[:, 0] + 1) / 2) * 2 * beta[:, 0]
+
+    shape = (len(configs), stream.player_count)
+    # combined, singles, doubles
+    ratings_mu = [np.broadcast_to(mu, shape).copy() for _ in range(3)]
+    ratings_sigma = [np.broadcast_to(sigma, shape).copy() for _ in range(3)]
+    log_loss = np.zeros(len(configs))
+    correct = np.zeros(len(configs))
+
+    matches = zip(
+        stream.home.tolist(),
+        stream.away.tolist(),
+        stream.is_double.tolist(),
+        stream.home_won.tolist(),
+        stream.draws_possible.tolist(),
+        strict=True,
+    )
+    for home, away, is_double, home_won, draws_possible in matches:
+        if is_double:
+            kind = 2
+            epsilon = draw_margin if draws_possible else no_draw_margin
+        else:
+            kind = 1
+            home, away = home[:1], away[:1]
+            epsilon = no_draw_margin
+
+        home_won_probability = _win_probability(
+            ratings_mu[kind][:, home],
+            ratings_sigma[kind][:, home],
+            ratings_mu[kind][:, away],
+            ratings_sigma[kind][:, away],
+            beta2,
+        )
+        p = np.clip(home_won_probability, _EPSILON, 1 - _EPSILON)
+        log_loss -= np.log(p if home_won else 1 - p)
+        correct += (home_won_probability > 0.5) == home_won
+
+        for k in (0, kind):
+            (
+                ratings_mu[k][:, home],
+                ratings_sigma[k][:, home],
+                ratings_mu[k][:, away],
+                ratings_sigma[k][:, away],
+            ) = _rate(
+                ratings_mu[k][:, home],
+                ratings_sigma[k][:, home],
+                ratings_mu[k][:, away],
+                ratings_sigma[k][:, away],
+                home_won,
+                epsilon,
+                beta2,
+                tau2,
+            )
+
+    match_count = max(stream.match_count, 1)
+    return [
+        SweepResult(
+            config=config,
+            match_count=stream.match_count,
+            log_loss=float(log_loss[i] / match_count),
+            accuracy=float(correct[i] / match_count),
+        )
+        for i, config in enumerate(configs)
+    ]
+
+
+def _win_probability(
+    home_mu: FloatArray,
+    home_sigma: FloatArray,
+    away_mu: FloatArray,
+    away_sigma: FloatArray,
+    beta2: FloatArray,
+) -> FloatArray:
+    """`SkillCalc.match_probabilities` with one beta per configuration."""
+    size = home_mu.shape[1] + away_mu.shape[1]
+    variance = size * beta2 + (home_sigma**2).sum(axis=1) + (away_sigma**2).sum(axis=1)
+    delta_mu = home_mu.sum(axis=1) - away_mu.sum(axis=1)
+    return special.ndtr(delta_mu / np.sqrt(variance))
+
+
+def _rate(
+    home_mu: FloatArray,
+    home_sigma: FloatArray,
+    away_mu: FloatArray,
+    away_sigma: FloatArray,
+    home_won: bool,
+    epsilon: FloatArray,
+    beta2: FloatArray,
+    tau2: FloatArray,
+) -> tuple[FloatArray, FloatArray, FloatArray, FloatArray]:
+    """`SkillCalc.rate_teams` of one match with one parameter set per row."""
+    home_variance = home_sigma**2 + tau2
+    away_variance = away_sigma**2 + tau2
+    size = home_mu.shape[1] + away_mu.shape[1]
+    c = np.sqrt(size * beta2 + home_variance.sum(axis=1) + away_variance.sum(axis=1))
+    sign = 1.0 if home_won else -1.0
+    x = (sign * (home_mu.sum(axis=1) - away_mu.sum(axis=1)) - epsilon) / c
+    v = np.exp(-0.5 * x**2 - _LOG_SQRT_2PI - special.log_ndtr(x))
+    w = v * (v + x)
+
+    home_step = (sign * v / c)[:, np.newaxis]
+    w_over_c2 = (w / c**2)[:, np.newaxis]
+    return (
+        home_mu + home_variance * home_step,
+        np.sqrt(home_variance * (1 - home_variance * w_over_c2)),
+        away_mu - away_variance * home_step,
+        np.sqrt(away_variance * (1 - away_variance * w_over_c2)),
+    )
+
+
+class RatingSweep:
+    """Replays the match history under many rating parameter sets.
+
+    The configurations are split into one chunk per worker process, each chunk
+    is replayed with `replay`.
+    """
+
+    def __init__(self, logger: Logger, workers: int) -> None:
+        self._logger = logger
+        self._workers = max(workers, 1)
+
+    def run(
+        self, stream: MatchStream, configs: Sequence[SweepConfig]
+    ) -> list[SweepResult]:
+        """Returns the results in the order of `configs`."""
+        start = time.perf_counter()
+        chunk_size = math.ceil(len(configs) / self._workers)
+        chunks = [
+            configs[i : i + chunk_size] for i in range(0, len(configs), chunk_size)
+        ]
+        if len(chunks) <= 1:
+            results = replay(stream, configs)
+        else:
+            with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+                results = [
+                    result
+                    for chunk_results in executor.map(
+                        replay, itertools.repeat(stream), chunks
+                    )
+                    for result in chunk_results
+                ]
+        self._logger.info(
+            f"Replayed {stream.match_count} matches under {len(configs)} "
+            f"configurations in {time.perf_counter() - start:.1f}s."
+        )
+        return results
@@ -1,14 +1,17 @@
+from collections.abc import Mapping
 from datetime import datetime
 from logging import Logger
+from pathlib import Path
 import re
+import threading
 from typing import cast
 
 from bs4 import BeautifulSoup
-import requests
 
 from scraper.custom_errors import ElementNotFound
 from scraper.extractor import Extractor
 from scraper.file_handler import FileHandler
+from scraper.http_client import HttpClient
 from shared.config.settings import Settings
 
 
@@ -18,43 +21,114 @@ class Scraper:
         logger: Logger,
         file_handler: FileHandler,
         extractor: Extractor,
+        settings: Settings,
+        http_client: HttpClient,
     ) -> None:
         self._extractor = extractor
         self._logger = logger
         self._file_handler = file_handler
+        self._settings = settings
+        self._http_client = http_client
+        # validators are only persisted after a completed crawl, so an interrupted
+        # run never marks a page as revalidated whose children were not fetched
+        self._pending_validators: dict[Path, dict[str, str]] = {}
+        self._pending_validators_lock = threading.Lock()
+
+    def get_HTML(
+        self, season: int, URL: str, revalidate: bool = False
+    ) -> BeautifulSoup | None:
+        """Returns the page from the server or the cache, None for no new content.
 
-    def get_HTML(self, season: int, URL: str) -> BeautifulSoup | None:
+        Cached season and division pages of the current season, or with
+        `revalidate`, are requested conditionally.
+        """
         file_path = self._file_handler.generate_path_from_url(URL=URL)
+        page_type = self._extractor.extract_page_type_from_url(URL)
 
         self._logger.debug(f"Checking file path: {file_path}")
         if not self._file_handler.exists(file_path):
-            HTML = self._get_from_server(URL=URL)
+            content = self._get_from_server(
+                URL=URL,
+                # only season and division pages are revalidated later on
+                file_path=file_path if page_type in ["saison", "liga"] else None,
+            )
+
+            HTML = self._extractor.parse_HTML(content)
+            index_entry = None
+            if page_type == "spielbericht":
+                index_entry = self._extractor.extract_index_entry(
+                    page_id=self._extractor.extract_page_id_from_url(URL), html=HTML
+                )
 
-            # cache the HTML
-            self._file_handler.write_HTML(HTML=HTML, file_path=file_path)
+            # cache the HTML as received
+            self._file_handler.write_HTML(
+                content=content, file_path=file_path, index_entry=index_entry
+            )
             self._logger.debug(f"HTML written to {file_path}")
             return HTML
         else:
-            if self._extractor is not None:
-                page_type = self._extractor.extract_page_type_from_url(URL)
             if page_type in ["saison", "liga"]:
                 # for the current season re-download HTML in case match reports updated
-                if season != datetime.now().year:
+                if season != datetime.now().year and not revalidate:
                     return self._file_handler.read_HTML(file_path)
                 else:
-                    # cache the HTML
-                    HTML = self._get_from_server(URL=URL)
-                    self._file_handler.write_HTML(HTML=HTML, file_path=file_path)
-                    return HTML
+                    return self._revalidate(URL=URL, file_path=file_path)
 
             self._logger.debug("Page type 'spielbericht': File already cached.")
             return None
 
-    def _get_from_server(self, URL: str) -> BeautifulSoup:
+    def persist_validators(self) -> None:
+        """Writes the validators of all pages fetched during this crawl."""
+        with self._pending_validators_lock:
+            for file_path, validators in self._pending_validators.items():
+                self._file_handler.write_validators(
+                    validators=validators, file_path=file_path
+                )
+            self._pending_validators.clear()
+
+    def _revalidate(self, URL: str, file_path: Path) -> BeautifulSoup | None:
+        """Conditional GET of a cached page.
+
+        Returns `None` for an unchanged division page, as it can't list any new
+        match reports. An unchanged season page is read from the cache, as its
+        divisions still need to be revalidated.
+        """
+        validators = self._file_handler.read_validators(file_path=file_path)
+        headers = {}
+        if "ETag" in validators:
+            headers["If-None-Match"] = validators["ETag"]
+        if "Last-Modified" in validators:
+            headers["If-Modified-Since"] = validators["Last-Modified"]
+
+        r = self._http_client.get(URL, headers=headers)
+        if r.status_code == 304:
+            self._logger.info(f"HTML not modified: {URL}")
+            if self._extractor.extract_page_type_from_url(URL) == "liga":
+                return None
+            return self._file_handler.read_HTML(file_path)
+
+        r.raise_for_status()
+        self._logger.info(f"HTML from server: {URL}")
+        self._remember_validators(file_path=file_path, headers=r.headers)
+        # cache the HTML as received
+        self._file_handler.write_HTML(content=r.content, file_path=file_path)
+        return self._extractor.parse_HTML(r.content)
+
+    def _get_from_server(self, URL: str, file_path: Path | None = None) -> bytes:
         self._logger.info(f"HTML from server: {URL}")
-        r = requests.get(URL)
+        r = self._http_client.get(URL)
         r.raise_for_status()
-        return BeautifulSoup(r.text, "html.parser")
+        if file_path is not None:
+            self._remember_validators(file_path=file_path, headers=r.headers)
+        return r.content
+
+    def _remember_validators(self, file_path: Path, headers: Mapping[str, str]) -> None:
+        validators = {
+            key: headers[key] for key in ("ETag", "Last-Modified") if key in headers
+        }
+        if validators:
+            with self._pending_validators_lock:
+                self._pending_validators[file_path] = validators
 
 
 class PlayerScraper:
@@ -63,10 +137,12 @@ class PlayerScraper:
         logger: Logger,
         file_handler: FileHandler,
         settings: Settings,
+        http_client: HttpClient,
     ) -> None:
         self._logger = logger
         self._file_handler = file_handler
         self._settings = settings
+        self._http_client = http_client
 
     def get_player_html(self, player_name: str) -> BeautifulSoup | int | None:
         """Returns html (from url or if cached from file) or DTFB_from_id or None."""
@@ -87,118 +163,128 @@ class PlayerScraper:
             else:
                 # try to scrape the player
                 self._logger.info("Retrieving additional player Information from DTFB:")
-                search_url = self._settings.DTFB_URL_BASE
-                data = {
-                    "filter": player_name,
-                    # value for "Bayerischer Tischfußballverband BTFV"
-                    "veranstalterid": 6,
-                }
-
-                r = requests.post(search_url, data=data)
-                r.raise_for_status()
-                soup = BeautifulSoup(r.text, "html.parser")
-
-                # find the link to the player details page
-                # m.b.: assuming first hit is the right one
-                player_detail_link = soup.find(
-                    "a", href=lambda href: href and "task=spieler_details" in href
-                )
-
-                if player_detail_link is None:
-                    self._logger.warning(
-                        f"Player {player_name} not found, writing to csv"
-                    )
-                    self._file_handler.append_to_csv(
-                        file_path=self._settings.DTFB_CSV_FILE,
-                        data={
-                            "player_hash": self._file_handler.generate_hash(
-                                player_name
-                            ),
-                            "DTFB_from_id": "",
-                            "player_name": player_name,
-                        },
-                    )
+                search_result = self.search_player(player_name=player_name)
+                if search_result is None:
                     return None
-
-                # Extract the relevant part of the URL
-                player_detail_url: str = cast(str, player_detail_link["href"])  # type: ignore
-                parts = player_detail_url.split("&")
-                match = re.search(r"(\d)+", parts[1])
-                if match:
-                    DTFB_from_id = int(match.group())
-
-                    full_player_url = f"https://dtfb.de{parts[0]}&{parts[1]}"
-                    self._logger.info(f"Player details URL: {full_player_url}")
-
-                    # Now, request the player details page
-                    player_response = requests.get(full_player_url)
-                    player_response.raise_for_status()
-                    # cache to disk
-                    if player_response:
-                        self._file_handler.write_HTML(
-                            BeautifulSoup(player_response.text, "html.parser"),
-                            path,
-                        )
-                        self._file_handler.append_to_csv(
-                            file_path=self._settings.DTFB_CSV_FILE,
-                            data={
-                                "player_hash": self._file_handler.generate_hash(
-                                    player_name
-                                ),
-                                "DTFB_from_id": cast(str, DTFB_from_id),
-                                "player_name": player_name,
-                            },
-                        )
-                        html = BeautifulSoup(player_response.text, "html.parser")
-                        # download image
-                        self._find_and_download_image(
-                            html=html, player_name=player_name
-                        )
-                        return html
-                raise ElementNotFound("DTFB_from_id not found")
+                DTFB_from_id, player_url = search_result
+                html = self.fetch_player_details(
+                    player_name=player_name,
+                    DTFB_from_id=DTFB_from_id,
+                    player_url=player_url,
+                )
+                # download image
+                self._find_and_download_image(html=html, player_name=player_name)
+                return html
         else:
             # get data from file
             self._logger.info("Retrieving additional player Information from file:")
             return self._file_handler.read_HTML(path)
 
-    def _already_tried(self, player_name: str) -> bool | int:
-        player_data = self._file_handler.read_csv_as_dict(
-            file_path=self._settings.DTFB_CSV_FILE
+    def is_player_known(self, player_name: str) -> bool:
+        """Checks if the player details are cached or were looked up before."""
+        path = self._file_handler.generate_path_for_player_html(player_name=player_name)
+        return self._file_handler.exists(path) or bool(
+            self._already_tried(player_name=player_name)
         )
-        player_hash = self._file_handler.generate_hash(string=player_name)
-        # look up player hash / player name and if a DTFB ID already has been cached
-        for row in player_data:
-            if row["player_hash"] == player_hash:
-                # lookup in csv: means already tried to scrape this particular player
-                if row["DTFB_from_id"]:
-                    # successfully tried to retrieve player before
-                    return int(row["DTFB_from_id"])
-                else:
-                    # unsuccessfully tried to retrieve player before
-                    return True
-        # never tried to look up player online
-        return False
+
+    def search_player(self, player_name: str) -> tuple[int, str] | None:
+        """Searches the player on the DTFB website.
+
+        Players not found are recorded in the player lookup store.
+
+        Returns:
+            DTFB_from_id and URL of the player details page, None if not found.
+        """
+        search_url = self._settings.DTFB_URL_BASE
+        data = {
+            "filter": player_name,
+            # value for "Bayerischer Tischfußballverband BTFV"
+            "veranstalterid": 6,
+        }
+
+        r = self._http_client.post(search_url, data=data)
+        r.raise_for_status()
+        soup = BeautifulSoup(r.content, self._settings.HTML_PARSER)
+
+        # find the link to the player details page
+        # m.b.: assuming first hit is the right one
+        player_detail_link = soup.find(
+            "a", href=lambda href: href and "task=spieler_details" in href
+        )
+
+        if player_detail_link is None:
+            self._logger.warning(f"Player {player_name} not found, writing to csv")
+            self._file_handler.add_player_lookup(
+                player_name=player_name, DTFB_from_id=None
+            )
+            return None
+
+        # Extract the relevant part of the URL
+        player_detail_url: str = cast(str, player_detail_link["href"])  # type: ignore
+        parts = player_detail_url.split("&")
+        match = re.search(r"(\d)+", parts[1])
+        if not match:
+            raise ElementNotFound("DTFB_from_id not found")
+        full_player_url = f"https://dtfb.de{parts[0]}&{parts[1]}"
+        self._logger.info(f"Player details URL: {full_player_url}")
+        return int(match.group()), full_player_url
+
+    def fetch_player_details(
+        self, player_name: str, DTFB_from_id: int, player_url: str
+    ) -> BeautifulSoup:
+        """Fetches and caches the player details page found by `search_player`."""
+        path = self._file_handler.generate_path_for_player_html(player_name=player_name)
+        # Now, request the player details page
+        player_response = self._http_client.get(player_url)
+        player_response.raise_for_status()
+        # cache to disk
+        self._file_handler.write_HTML(content=player_response.content, file_path=path)
+        self._file_handler.add_player_lookup(
+            player_name=player_name, DTFB_from_id=DTFB_from_id
+        )
+        return BeautifulSoup(player_response.content, self._settings.HTML_PARSER)
+
+    def _already_tried(self, player_name: str) -> bool | int:
+        # look up player hash and if a DTFB ID already has been cached
+        entry = self._file_handler.get_player_lookup(player_name=player_name)
+        if entry is None:
+            # never tried to look up player online
+            return False
+        if entry.DTFB_from_id is not None:
+            # successfully tried to retrieve player before
+            return entry.DTFB_from_id
+        # unsuccessfully tried to retrieve player before
+        return True
 
     def _find_and_download_image(self, html: BeautifulSoup, player_name: str) -> None:
+        image_url = self.find_image_url(html=html)
+        if image_url:
+            self.download_image(image_url=image_url, player_name=player_name)
+
+    def find_image_url(self, html: BeautifulSoup) -> str | None:
+        """Returns the URL of the player image, None for the dummy image."""
         # Find the URL with "spieler" and ending in ".jpg"
         pattern = re.compile(r'https://[^"]*spieler[^"]*\.jpg|png')
         match = html.find("img", {"src": pattern})
 
         if match and "src" in match.attrs:  # type: ignore
-            image_url = match["src"]  # type: ignore
+            image_url = cast(str, match["src"])  # type: ignore
             self._logger.info(f"Found image URL: {image_url}")
             if (
                 image_url
                 == "https://dtfb.de/images/sportsmanager/spieler/ImT1661962960W180H240.png"
             ):
                 self._logger.info("Only dummy image, not saving")
-                return
-            response = requests.get(image_url)  # type: ignore
-            response.raise_for_status()
-            self._file_handler.write_image(
-                response=response, name=player_name, page_type="player"
-            )
+                return None
+            return image_url
 
         else:
             self._logger.info("No matching image URL found in HTML.")
-            return
+            return None
+
+    def download_image(self, image_url: str, player_name: str) -> None:
+        response = self._http_client.get(image_url)
+        response.raise_for_status()
+        self._file_handler.write_image(
+            response=response, name=player_name, page_type="player"
+        )
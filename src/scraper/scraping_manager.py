@@ -1,15 +1,89 @@
-from datetime import datetime
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime
+import logging
 from logging import Logger
+from pathlib import Path
+from typing import cast
 
 from bs4 import BeautifulSoup
+from sqlalchemy import select
 
+from scraper.crawl_frontier import (
+    CLOSED,
+    FETCHED,
+    OPEN,
+    PENDING,
+    CrawlFrontier,
+    FrontierEntry,
+)
+from scraper.custom_errors import ResumeNotPossible
 from scraper.db_populator import DbPopulator
+from scraper.extraction_cache import ExtractionCache
 from scraper.extractor import Extractor
 from scraper.file_handler import FileHandler
+from scraper.match_report import MatchReport
+from scraper.player_enrichment import PlayerEnrichment
 from scraper.scraper import PlayerScraper, Scraper
-from shared.config import settings
 from shared.config.settings import Settings
 from shared.database.database import Database
+from shared.database.models import Match, Player
+
+# per-process state of the extraction workers used for full rebuilds
+_worker_file_handler: FileHandler | None = None
+_worker_extractor: Extractor | None = None
+_worker_extraction_cache: ExtractionCache | None = None
+
+# match reports sent to an extraction worker at once
+_EXTRACTION_CHUNK_SIZE = 16
+
+
+def _init_extraction_worker(settings: Settings) -> None:
+    global _worker_file_handler, _worker_extractor, _worker_extraction_cache
+    _worker_file_handler = FileHandler(
+        logger=logging.getLogger("filehandler"), settings=settings
+    )
+    _worker_extractor = Extractor(
+        logger=logging.getLogger("extractor"), settings=settings
+    )
+    _worker_extraction_cache = ExtractionCache(
+        logger=logging.getLogger("filehandler"),
+        cache_path=settings.EXTRACTION_CACHE_FILE,
+        fingerprint=Extractor.fingerprint(),
+    )
+
+
+def _load_match_report(
+    file_handler: FileHandler,
+    extractor: Extractor,
+    extraction_cache: ExtractionCache,
+    file_path: Path,
+) -> MatchReport:
+    """Returns the cached extraction result or parses and extracts the report."""
+    page_id = file_handler.extract_page_id_from_path(file_path=file_path)
+    content = file_handler.read_raw_HTML(file_path=file_path)
+    report = extraction_cache.get(page_id, content)
+    if report is None:
+        report = extractor.extract_data(
+            page_id=page_id, html=extractor.parse_HTML(content)
+        )
+        extraction_cache.put(page_id, content, report)
+    return report
+
+
+def _extract_match_report(file_path: Path) -> MatchReport:
+    """Loads a cached match report inside an extraction worker."""
+    return _load_match_report(
+        cast(FileHandler, _worker_file_handler),
+        cast(Extractor, _worker_extractor),
+        cast(ExtractionCache, _worker_extraction_cache),
+        file_path,
+    )
+
+
+def _extract_match_reports(file_paths: list[Path]) -> list[MatchReport]:
+    return [_extract_match_report(file_path) for file_path in file_paths]
 
 
 class ScrapingManager:
@@ -19,21 +93,26 @@ class ScrapingManager:
         settings: Settings,
         scraper: Scraper,
         player_scraper: PlayerScraper,
+        player_enrichment: PlayerEnrichment,
         extractor: Extractor,
         db_populator: DbPopulator,
         database: Database,
         file_handler: FileHandler,
+        extraction_cache: ExtractionCache,
+        crawl_frontier: CrawlFrontier,
     ) -> None:
         self.logger = logger
         self.settings = settings
         self.scraper = scraper
         self.player_scraper = player_scraper
+        self.player_enrichment = player_enrichment
         self.extractor = extractor
         self.db_populator = db_populator
         self.database = database
         self.file_handler = file_handler
+        self.extraction_cache = extraction_cache
         self.player_scraper = player_scraper
-        self._generate_starting_url()
+        self.crawl_frontier = crawl_frontier
 
     def _generate_starting_url(self) -> list[str]:
         return [
@@ -47,40 +126,138 @@ class ScrapingManager:
         else:
             return 2000 + page_id + 1
 
+    def _fetch_all(
+        self, season: int, URLs: list[str], revalidate: bool = False
+    ) -> list[BeautifulSoup | None]:
+        """Fetches several pages, concurrently if more than one worker is configured.
+
+        The results are returned in the same order as the given URLs.
+        """
+        max_workers = self.settings.SCRAPER_MAX_WORKERS
+        if max_workers <= 1 or len(URLs) <= 1:
+            return [self.scraper.get_HTML(season, URL, revalidate) for URL in URLs]
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="crawler"
+        ) as executor:
+            return list(
+                executor.map(
+                    lambda URL: self.scraper.get_HTML(season, URL, revalidate), URLs
+                )
+            )
+
+    def _discover_seasons(self) -> None:
+        """Adds the season pages up to the current year to the crawl frontier."""
+        for season_url in self._generate_starting_url():
+            season_page_id = self.extractor.extract_page_id_from_url(season_url)
+            self.crawl_frontier.add(
+                [season_url],
+                page_type="saison",
+                season=self._get_season_from_season_page_id(season_page_id),
+            )
+
+    def _expand(
+        self, season: int, entries: list[FrontierEntry], child_page_type: str
+    ) -> None:
+        """Fetches season or division pages and records the pages they link to.
+
+        Pages of past seasons are closed after their first expansion, open ones
+        were last expanded during their season and are revalidated once more.
+        The links of a page are only extracted again if its content changed.
+        """
+        htmls = self._fetch_all(
+            season,
+            [entry.URL for entry in entries],
+            revalidate=any(entry.status == OPEN for entry in entries),
+        )
+        status = OPEN if season >= datetime.now().year else CLOSED
+        for entry, html in zip(entries, htmls, strict=True):
+            if html is None and entry.children is not None:
+                # division not modified since the last run
+                self.crawl_frontier.record_fetch(entry.URL, status)
+                continue
+            if html is None:
+                html = self.file_handler.read_HTML(self._get_cache_path(entry.URL))
+            content_hash = self._get_content_hash(entry.URL)
+            children = entry.children
+            if children is None or content_hash != entry.content_hash:
+                children = self.extractor.extract_urls(
+                    page_type=child_page_type, html=html
+                )
+            self.crawl_frontier.record_fetch(
+                entry.URL, status, content_hash=content_hash, children=children
+            )
+            self.crawl_frontier.add(children, page_type=child_page_type, season=season)
+
     def _process_match_reports(
-        self, season: int, division_url: str
+        self, season: int, entries: list[FrontierEntry]
     ) -> list[tuple[int, BeautifulSoup]]:
-        """Fetches and processes match reports for a given division."""
-        html = self.scraper.get_HTML(season, division_url)
-        if not html:
-            return []
+        """Fetches the new match reports of a season.
 
+        Match reports downloaded by an interrupted run are read from the cache.
+        Already cached ones are closed without being returned if they are in
+        the database.
+        """
         match_report_data = []
-        match_report_urls = self.extractor.extract_urls(
-            page_type="spielbericht", html=html
+        pending = [entry for entry in entries if entry.status == PENDING]
+        match_htmls = self._fetch_all(season, [entry.URL for entry in pending])
+        # cached by an earlier run that may have populated them before failing
+        cached = [
+            entry
+            for entry, match_html in zip(pending, match_htmls, strict=True)
+            if match_html is None
+        ] + [entry for entry in entries if entry.status == FETCHED]
+        populated_page_ids = self._get_populated_page_ids(
+            [self.extractor.extract_page_id_from_url(entry.URL) for entry in cached]
         )
+        for entry in cached:
+            page_id = self.extractor.extract_page_id_from_url(entry.URL)
+            if page_id in populated_page_ids:
+                self.crawl_frontier.record_fetch(entry.URL, CLOSED)
+                continue
+            if entry.status == PENDING:
+                self.crawl_frontier.record_fetch(
+                    entry.URL, FETCHED, content_hash=self._get_content_hash(entry.URL)
+                )
+            match_report_data.append(
+                (
+                    entry.URL,
+                    self.file_handler.read_HTML(self._get_cache_path(entry.URL)),
+                )
+            )
+        for entry, match_html in zip(pending, match_htmls, strict=True):
+            if match_html is not None:
+                self.crawl_frontier.record_fetch(
+                    entry.URL, FETCHED, content_hash=self._get_content_hash(entry.URL)
+                )
+                match_report_data.append((entry.URL, match_html))
 
-        for match_report_url in match_report_urls:
-            match_html = self.scraper.get_HTML(season, match_report_url)
-            if match_html:
-                match_report_page_id = self.extractor.extract_page_id_from_url(
-                    match_report_url
+        match_reports = []
+        for match_report_url, match_html in match_report_data:
+            match_report_page_id = self.extractor.extract_page_id_from_url(
+                match_report_url
+            )
+            match_reports.append((match_report_page_id, match_html))
+            self.logger.info(f"New match report found: {match_report_page_id}")
+        return match_reports
+
+    def _get_populated_page_ids(self, page_ids: list[int]) -> set[int]:
+        if not page_ids:
+            return set()
+        with self.database.get_sync_session() as session:
+            return set(
+                session.scalars(
+                    select(Match.BTFV_from_id)
+                    .where(Match.BTFV_from_id.in_(page_ids))
+                    .distinct()
                 )
-                match_report_data.append((match_report_page_id, match_html))
-                self.logger.info(f"New match report found: {match_report_page_id}")
+            )
 
-        return match_report_data
+    def _get_cache_path(self, URL: str) -> Path:
+        return self.file_handler.generate_path_from_url(URL=URL)
 
-    def _process_divisions(
-        self, season: int, season_html: BeautifulSoup
-    ) -> list[tuple[int, BeautifulSoup]]:
-        """Fetches and processes divisions for a given season."""
-        division_urls = self.extractor.extract_urls(page_type="liga", html=season_html)
-        all_match_reports = []
-        for division_url in division_urls:
-            match_reports = self._process_match_reports(season, division_url)
-            all_match_reports.extend(match_reports)
-        return all_match_reports
+    def _get_content_hash(self, URL: str) -> str:
+        content = self.file_handler.read_raw_HTML(file_path=self._get_cache_path(URL))
+        return ExtractionCache.generate_content_hash(content).hex()
 
     def _sort_match_reports(
         self, match_report_data: list[tuple[int, BeautifulSoup]]
@@ -92,29 +269,57 @@ class ScrapingManager:
         )
 
     def process_seasons(self) -> None:
-        """Process all seasons."""
+        """Expands the pages that can still change and adds new match reports.
+
+        The crawl frontier knows every page of earlier runs: closed seasons and
+        divisions are skipped, so a run only revalidates the current season
+        and fetches the match reports discovered since the last run.
+        """
         new_match_report_data_by_season = {}
+        self._discover_seasons()
 
-        for season_url in self._generate_starting_url():
-            season_page_id = self.extractor.extract_page_id_from_url(season_url)
-            season = self._get_season_from_season_page_id(season_page_id)
+        for season_entry in self.crawl_frontier.get_due(page_type="saison"):
+            season = season_entry.season
             self.logger.info(
-                f"Processing: Season {season}, Page ID {season_page_id}, "
-                f"Season URL {season_url}"
+                f"Processing: Season {season}, Season URL {season_entry.URL}"
+            )
+            self._expand(season, [season_entry], child_page_type="liga")
+        for season in sorted(
+            {entry.season for entry in self.crawl_frontier.get_due(page_type="liga")}
+        ):
+            self._expand(
+                season,
+                self.crawl_frontier.get_due(page_type="liga", season=season),
+                child_page_type="spielbericht",
             )
 
-            season_html = self.scraper.get_HTML(season, season_url)
-            if not season_html:
-                continue
-
-            # Process all divisions and gather match report data
-            match_report_data = self._process_divisions(season, season_html)
+        # closed as soon as they are in the database
+        match_report_URLs: dict[int, str] = {}
+        for season in sorted(
+            {
+                entry.season
+                for entry in self.crawl_frontier.get_due(page_type="spielbericht")
+            }
+        ):
+            entries = self.crawl_frontier.get_due(
+                page_type="spielbericht", season=season
+            )
+            match_report_data = self._process_match_reports(season, entries)
+            match_report_URLs.update(
+                (self.extractor.extract_page_id_from_url(entry.URL), entry.URL)
+                for entry in entries
+            )
 
             # Sort match reports by date
             sorted_match_reports = self._sort_match_reports(match_report_data)
             new_match_report_data_by_season[season] = sorted_match_reports
 
-        self.extract_data_and_populate_db(new_match_report_data_by_season)
+        # all pages were fetched: the next run may revalidate them conditionally
+        self.scraper.persist_validators()
+
+        self.extract_data_and_populate_db(
+            new_match_report_data_by_season, match_report_URLs
+        )
 
     def process_season(self, season: int) -> None:
         """Convenience function: Process one season."""
@@ -126,8 +331,14 @@ class ScrapingManager:
     def extract_data_and_populate_db(
         self,
         new_match_report_data_by_season: dict[int, list[tuple[int, BeautifulSoup]]],
+        match_report_URLs: dict[int, str] | None = None,
     ) -> None:
-        """Logs and extracts data from new match reports."""
+        """Logs and extracts data from new match reports.
+
+        The frontier entry of a match report in `match_report_URLs` is closed
+        right after its transaction committed, so a failing report never makes
+        the next run insert the reports populated before it a second time.
+        """
         match_report_count = len(
             {x for v in new_match_report_data_by_season.values() for x in v}
         )
@@ -137,40 +348,176 @@ class ScrapingManager:
                 self.logger.info(f"{season}: {len(tuple_list)} match reports.")
                 for page_id, html in tuple_list:
                     self.db_populator.populate(page_id, html)
+                    if match_report_URLs and page_id in match_report_URLs:
+                        self.crawl_frontier.record_fetch(
+                            match_report_URLs[page_id], CLOSED
+                        )
         else:
             self.logger.info("No new match reports found.")
 
-    def populate_with_all_available_cached_data(self) -> None:
+    def populate_with_all_available_cached_data(self, resume: bool = False) -> None:
+        """Rebuilds the database from all cached match reports.
+
+        With `resume` an interrupted batched rebuild continues after the last
+        committed match report instead of starting over. If that match report
+        is not cached anymore, the database is rebuilt from scratch.
+        """
         # new_match_report_data_by_season: dict[int, list[tuple[int, BeautifulSoup]]],
-        self.database.init_db()
+        if not resume:
+            # cached instances would refer to dropped rows
+            self.db_populator.reset()
+            self.database.init_db()
+        reports = self.load_all_match_reports()
+        try:
+            failed_page_ids = self.db_populator.populate_batch(reports, resume=resume)
+        except ResumeNotPossible as e:
+            self.logger.warning(f"{e!s} Rebuilding the database from scratch.")
+            self.populate_with_all_available_cached_data()
+            return
+        if failed_page_ids:
+            self.logger.warning(f"Skipped match reports: {failed_page_ids}")
+
+    def load_all_match_reports(self) -> Iterator[MatchReport]:
+        """Yields all cached match reports extracted and sorted by date."""
         file_paths = self.file_handler.get_all_cached_match_reports()
-        self.logger.info(
-            "Sorting the file path list by date. This might take a while..."
-        )
-        file_paths = sorted(
-            file_paths,
-            key=lambda filepath: self.extractor.extract_date(
-                BeautifulSoup(filepath.read_text(encoding="utf-8"), "html.parser")
-            ),
+        self.logger.info("Sorting the file path list by date.")
+        file_paths = sorted(file_paths, key=self._get_match_report_date)
+        return self._load_match_reports(file_paths)
+
+    def _load_match_reports(self, file_paths: list[Path]) -> Iterator[MatchReport]:
+        """Yields the extracted match reports in the order of `file_paths`."""
+        if self.settings.EXTRACTION_WORKERS <= 1:
+            for file_path in file_paths:
+                yield self._load_match_report(file_path)
+            return
+
+        # parsing and extraction run on all cores, ratings and database writes
+        # stay in this process and consume the records in date order
+        with ProcessPoolExecutor(
+            max_workers=self.settings.EXTRACTION_WORKERS,
+            initializer=_init_extraction_worker,
+            initargs=(self.settings,),
+        ) as executor:
+            # a bounded window of chunks in flight, `map` would submit all files
+            # up front and hold every extracted report not consumed yet
+            window: deque[Future[list[MatchReport]]] = deque()
+            chunks = (
+                file_paths[start : start + _EXTRACTION_CHUNK_SIZE]
+                for start in range(0, len(file_paths), _EXTRACTION_CHUNK_SIZE)
+            )
+            for chunk in chunks:
+                if len(window) >= 2 * self.settings.EXTRACTION_WORKERS:
+                    yield from window.popleft().result()
+                window.append(executor.submit(_extract_match_reports, chunk))
+            while window:
+                yield from window.popleft().result()
+
+    def _get_match_report_date(self, file_path: Path) -> date:
+        """Looks up the date of a cached match report in the match report index.
+
+        Match reports cached before the index existed are parsed once and added.
+        """
+        page_id = self.file_handler.extract_page_id_from_path(file_path=file_path)
+        index_entry = self.file_handler.get_match_report_index_entry(page_id)
+        if index_entry is None:
+            index_entry = self.extractor.extract_index_entry(
+                page_id=page_id, html=self.file_handler.read_HTML(file_path=file_path)
+            )
+            self.file_handler.add_to_match_report_index(index_entry)
+        return index_entry.date
+
+    def _load_match_report(self, file_path: Path) -> MatchReport:
+        return _load_match_report(
+            self.file_handler, self.extractor, self.extraction_cache, file_path
         )
-        for file_path in file_paths:
-            page_id = self.file_handler.extract_page_id_from_path(file_path=file_path)
-            html = self.file_handler.read_HTML(file_path=file_path)
-            self.db_populator.populate(page_id=page_id, html=html)
+
+    def _get_match_report_path(self, page_id: int) -> Path:
+        return self.settings.MATCH_REPORT_HTML_PATH / f"spielbericht_{page_id}.html"
 
     def populate_by_page_id(self, page_id: int) -> None:
         # convenient function for debugging a particular match report
-        path = settings.settings.MATCH_REPORT_HTML_PATH / f"spielbericht_{page_id}.html"
-        html = self.file_handler.read_HTML(path)
-        self.db_populator.populate(page_id=page_id, html=html)
+        path = self._get_match_report_path(page_id)
+        self.db_populator.populate_extracted(self._load_match_report(path))
+
+    def recompute(self, page_ids: list[int], since: date | None = None) -> None:
+        """Recomputes the ratings from the first affected match on.
+
+        Used after match reports (`page_ids`) were corrected or the extraction
+        changed from `since` on: all later matches are removed and only the
+        cached match reports from there on are replayed.
+        """
+        dates = [] if since is None else [since]
+        for page_id in page_ids:
+            # the corrected match report may have been moved to another date
+            index_entry = self.extractor.extract_index_entry(
+                page_id=page_id,
+                html=self.file_handler.read_HTML(self._get_match_report_path(page_id)),
+            )
+            self.file_handler.add_to_match_report_index(index_entry)
+            dates.append(index_entry.date)
+        if not dates:
+            return
+
+        earliest = min(dates)
+        removed_page_ids = self.db_populator.rewind(since=earliest, page_ids=page_ids)
+        file_paths = [
+            file_path
+            for file_path in self.file_handler.get_all_cached_match_reports()
+            if self._get_match_report_date(file_path) >= earliest
+            or self.file_handler.extract_page_id_from_path(file_path=file_path)
+            in removed_page_ids
+        ]
+        file_paths = sorted(file_paths, key=self._get_match_report_date)
+        self.logger.info(f"Replaying {len(file_paths)} match reports from {earliest}.")
+        for report in self._load_match_reports(file_paths):
+            self.db_populator.populate_extracted(report)
 
     def get_all_player_html(self) -> None:
-        file_paths = self.file_handler.get_all_cached_match_reports()
-        for file_path in file_paths:
+        """Fetches the DTFB details of all players not looked up yet."""
+        self.player_enrichment.run(self._get_all_player_names())
+
+    def _get_all_player_names(self) -> set[str]:
+        with self.database.get_sync_session() as session:
+            player_names = set(session.scalars(select(Player.name)))
+        if not player_names:
+            # not populated yet: the extraction cache avoids parsing the reports
+            for report in self.load_all_match_reports():
+                player_names.update(report.home_players + report.away_players)
+        return player_names
+
+    def verify_parser_parity(self, parser: str = "lxml") -> list[Path]:
+        """Compares the extraction results of `parser` with the built-in parser.
+
+        Runs over all cached match reports and player pages and returns the paths
+        of all files with differing results.
+        """
+        mismatches = []
+        for file_path in self.file_handler.get_all_cached_match_reports():
             page_id = self.file_handler.extract_page_id_from_path(file_path=file_path)
-            html = self.file_handler.read_HTML(file_path=file_path)
-            self.extractor.extract_data(page_id=page_id, html=html)
-            for player_name in (
-                self.extractor.away_players + self.extractor.away_players
-            ):
-                self.player_scraper.get_player_html(player_name=player_name)
+            content = self.file_handler.read_raw_HTML(file_path=file_path)
+            reports = [
+                self.extractor.extract_data(
+                    page_id=page_id,
+                    html=self.extractor.parse_HTML(content, parser=backend),
+                )
+                for backend in ("html.parser", parser)
+            ]
+            if reports[0] != reports[1]:
+                self.logger.warning(f"Parser results differ: {file_path}")
+                mismatches.append(file_path)
+
+        for file_path in self.file_handler.get_all_cached_player_pages():
+            content = self.file_handler.read_raw_HTML(file_path=file_path)
+            player_infos = [
+                self.extractor.extract_DTFB_player_information(
+                    player_html=self.extractor.parse_HTML(content, parser=backend),
+                    player_name=file_path.stem,
+                )
+                for backend in ("html.parser", parser)
+            ]
+            if player_infos[0] != player_infos[1]:
+                self.logger.warning(f"Parser results differ: {file_path}")
+                mismatches.append(file_path)
+
+        self.logger.info(f"{len(mismatches)} files with differing parser results.")
+        return mismatches
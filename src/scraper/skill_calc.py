@@ -1,11 +1,22 @@
 import itertools
 import math
-from typing import List, Tuple
+from typing import ClassVar, List, Tuple
 
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+from scipy import special
 import trueskill  # type: ignore
 
+FloatArray = NDArray[np.float64]
+
+# outcomes of the batched two-team kernel, seen from the home team
+HOME_WIN, DRAW, AWAY_WIN = 1, 0, -1
+
 
 class SkillCalc:
+    # shared environments with the default parameters, see `for_draw_probability`
+    _registry: ClassVar[dict[float, "SkillCalc"]] = {}
+
     def __init__(
         self,
         mu: float = 25.0,
@@ -24,6 +35,17 @@ class SkillCalc:
         self.tau = tau
         self.draw_probability = draw_probability
 
+    @classmethod
+    def for_draw_probability(cls, draw_probability: float) -> "SkillCalc":
+        """Returns the shared environment with the default parameters.
+
+        Building a `trueskill.TrueSkill` environment is not free, so the
+        environments are created once per draw probability and reused.
+        """
+        if draw_probability not in cls._registry:
+            cls._registry[draw_probability] = cls(draw_probability=draw_probability)
+        return cls._registry[draw_probability]
+
     def rate_single_match(
         self,
         player1_rating: trueskill.Rating,
@@ -75,15 +97,162 @@ class SkillCalc:
         self, team1: List[trueskill.Rating], team2: List[trueskill.Rating]
     ) -> float:
         """Calculate the win probability of team1 over team2."""
+        return self.match_probabilities(team1, team2)[1]
+
+    def match_probabilities(
+        self, team1: List[trueskill.Rating], team2: List[trueskill.Rating]
+    ) -> Tuple[float, float]:
+        """Calculate the match quality (draw probability) and the win probability.
+
+        Both share the performance difference of the teams, which is computed
+        once. The quality equals `env.quality` for two teams.
+        """
         delta_mu = sum(r.mu for r in team1) - sum(r.mu for r in team2)
         sum_sigma = sum(r.sigma**2 for r in itertools.chain(team1, team2))
-        size = len(team1) + len(team2)
-        denom = math.sqrt(size * (self.beta**2) + sum_sigma)
-        self.env.cdf(delta_mu / denom)
-        return self.env.cdf(delta_mu / denom)
+        size_beta2 = (len(team1) + len(team2)) * (self.beta**2)
+        variance = size_beta2 + sum_sigma
+        quality = math.sqrt(size_beta2 / variance) * math.exp(
+            -(delta_mu**2) / (2 * variance)
+        )
+        return quality, self.env.cdf(delta_mu / math.sqrt(variance))
 
     def create_rating(
         self, mu: float | None = None, sigma: float | None = None
     ) -> trueskill.Rating:
         """Create a new TrueSkill rating for a player."""
         return self.env.Rating(mu=mu or self.mu, sigma=sigma or self.sigma)
+
+    def draw_margin(self, size: int) -> float:
+        """Draw margin of a match with `size` players, like `trueskill`."""
+        return float(
+            special.ndtri((self.draw_probability + 1) / 2) * math.sqrt(size) * self.beta
+        )
+
+    def rate_teams(
+        self,
+        home_mu: ArrayLike,
+        home_sigma: ArrayLike,
+        away_mu: ArrayLike,
+        away_sigma: ArrayLike,
+        outcome: ArrayLike,
+    ) -> tuple[FloatArray, FloatArray, FloatArray, FloatArray]:
+        """Rates a batch of two-team matches in closed form.
+
+        With only two teams the TrueSkill factor graph reduces to a single
+        truncated Gaussian, so all matches are updated with a few array
+        operations. Ratings have the shape (matches, team size), `outcome` holds
+        `HOME_WIN`, `DRAW` or `AWAY_WIN` per match.
+
+        Returns:
+            New mu and sigma of the home and the away players.
+        """
+        home_mu, home_sigma, away_mu, away_sigma = (
+            np.asarray(ratings, dtype=np.float64)
+            for ratings in (home_mu, home_sigma, away_mu, away_sigma)
+        )
+        outcome = np.asarray(outcome)
+        # dynamics are added before the update, like `trueskill.TrueSkill.rate`
+        home_variance = home_sigma**2 + self.tau**2
+        away_variance = away_sigma**2 + self.tau**2
+        size = home_mu.shape[1] + away_mu.shape[1]
+        c = np.sqrt(
+            size * self.beta**2 + home_variance.sum(axis=1) + away_variance.sum(axis=1)
+        )
+        # the winner comes first, draws keep the home team first
+        sign = np.where(outcome == AWAY_WIN, -1.0, 1.0)
+        t = sign * (home_mu.sum(axis=1) - away_mu.sum(axis=1)) / c
+        epsilon = self.draw_margin(size) / c
+        v, w = self._v_w(t, epsilon, drawn=outcome == DRAW)
+
+        home_step = (sign * v / c)[:, np.newaxis]
+        w_over_c2 = (w / c**2)[:, np.newaxis]
+        return (
+            home_mu + home_variance * home_step,
+            np.sqrt(home_variance * (1 - home_variance * w_over_c2)),
+            away_mu - away_variance * home_step,
+            np.sqrt(away_variance * (1 - away_variance * w_over_c2)),
+        )
+
+    def quality_teams(
+        self,
+        home_mu: ArrayLike,
+        home_sigma: ArrayLike,
+        away_mu: ArrayLike,
+        away_sigma: ArrayLike,
+    ) -> FloatArray:
+        """Batched `trueskill.TrueSkill.quality` for two teams."""
+        quality, _ = self.match_probabilities_teams(
+            home_mu, home_sigma, away_mu, away_sigma
+        )
+        return quality
+
+    def win_probability_teams(
+        self,
+        home_mu: ArrayLike,
+        home_sigma: ArrayLike,
+        away_mu: ArrayLike,
+        away_sigma: ArrayLike,
+    ) -> FloatArray:
+        """Batched `win_probability` of the home teams."""
+        _, win_probability = self.match_probabilities_teams(
+            home_mu, home_sigma, away_mu, away_sigma
+        )
+        return win_probability
+
+    def match_probabilities_teams(
+        self,
+        home_mu: ArrayLike,
+        home_sigma: ArrayLike,
+        away_mu: ArrayLike,
+        away_sigma: ArrayLike,
+    ) -> tuple[FloatArray, FloatArray]:
+        """Batched `match_probabilities`: quality and home win probability."""
+        delta_mu, variance, size_beta2 = self._team_difference(
+            home_mu, home_sigma, away_mu, away_sigma
+        )
+        quality = np.sqrt(size_beta2 / variance) * np.exp(
+            -(delta_mu**2) / (2 * variance)
+        )
+        return quality, special.ndtr(delta_mu / np.sqrt(variance))
+
+    def _team_difference(
+        self,
+        home_mu: ArrayLike,
+        home_sigma: ArrayLike,
+        away_mu: ArrayLike,
+        away_sigma: ArrayLike,
+    ) -> tuple[FloatArray, FloatArray, float]:
+        """Mean and variance of the performance difference, without dynamics."""
+        home_mu, home_sigma, away_mu, away_sigma = (
+            np.asarray(ratings, dtype=np.float64)
+            for ratings in (home_mu, home_sigma, away_mu, away_sigma)
+        )
+        size_beta2 = (home_mu.shape[1] + away_mu.shape[1]) * self.beta**2
+        variance = (
+            size_beta2 + (home_sigma**2).sum(axis=1) + (away_sigma**2).sum(axis=1)
+        )
+        return home_mu.sum(axis=1) - away_mu.sum(axis=1), variance, size_beta2
+
+    def _v_w(
+        self, t: FloatArray, epsilon: FloatArray, drawn: NDArray[np.bool_]
+    ) -> tuple[FloatArray, FloatArray]:
+        """The "V" and "W" functions of `trueskill` for wins and draws."""
+        v = np.empty_like(t)
+        w = np.empty_like(t)
+
+        won = ~drawn
+        x = t[won] - epsilon[won]
+        # pdf / cdf in log space stays finite for large upsets
+        v[won] = np.exp(-0.5 * x**2 - 0.5 * math.log(2 * math.pi) - special.log_ndtr(x))
+        w[won] = v[won] * (v[won] + x)
+
+        abs_t = np.abs(t[drawn])
+        a = epsilon[drawn] - abs_t
+        b = -epsilon[drawn] - abs_t
+        denominator = special.ndtr(a) - special.ndtr(b)
+        pdf_a = np.exp(-0.5 * a**2) / math.sqrt(2 * math.pi)
+        pdf_b = np.exp(-0.5 * b**2) / math.sqrt(2 * math.pi)
+        v_drawn = (pdf_b - pdf_a) / denominator
+        v[drawn] = np.where(t[drawn] < 0, -v_drawn, v_drawn)
+        w[drawn] = v_drawn**2 + (a * pdf_a - b * pdf_b) / denominator
+        return v, w
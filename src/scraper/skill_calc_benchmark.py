@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+import time
+
+import numpy as np
+
+from scraper.skill_calc import AWAY_WIN, HOME_WIN, SkillCalc
+
+
+@dataclass(frozen=True, slots=True)
+class BenchmarkResult:
+    match_count: int
+    team_size: int
+    per_match_seconds: float
+    batched_seconds: float
+    max_deviation: float
+
+    @property
+    def speedup(self) -> float:
+        return self.per_match_seconds / self.batched_seconds
+
+
+def run_benchmark(
+    match_count: int = 10_000, team_size: int = 2, seed: int = 0
+) -> BenchmarkResult:
+    """Times the per-match `trueskill` path against the batched kernel.
+
+    Rates the same random matches both ways and reports the largest
+    difference of any new mu or sigma.
+    """
+    skill_calc = SkillCalc()
+    rng = np.random.default_rng(seed)
+    shape = (match_count, team_size)
+    home_mu = rng.normal(25.0, 6.0, shape)
+    home_sigma = rng.uniform(0.8, 8.3, shape)
+    away_mu = rng.normal(25.0, 6.0, shape)
+    away_sigma = rng.uniform(0.8, 8.3, shape)
+    outcome = rng.choice([HOME_WIN, AWAY_WIN], match_count)
+
+    start = time.perf_counter()
+    per_match = np.empty((4, *shape))
+    for i in range(match_count):
+        home = [
+            skill_calc.create_rating(mu=mu, sigma=sigma)
+            for mu, sigma in zip(home_mu[i], home_sigma[i], strict=True)
+        ]
+        away = [
+            skill_calc.create_rating(mu=mu, sigma=sigma)
+            for mu, sigma in zip(away_mu[i], away_sigma[i], strict=True)
+        ]
+        if team_size == 1:
+            new_home1, new_away1 = skill_calc.rate_single_match(
+                home[0],
+                away[0],
+                winner="player1" if outcome[i] == HOME_WIN else "player2",
+            )
+            new_home, new_away = [new_home1], [new_away1]
+        else:
+            new_home, new_away = skill_calc.rate_double_match(
+                home, away, winner="team1" if outcome[i] == HOME_WIN else "team2"
+            )
+        per_match[:, i] = (
+            [rating.mu for rating in new_home],
+            [rating.sigma for rating in new_home],
+            [rating.mu for rating in new_away],
+            [rating.sigma for rating in new_away],
+        )
+    per_match_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = np.stack(
+        skill_calc.rate_teams(home_mu, home_sigma, away_mu, away_sigma, outcome)
+    )
+    batched_seconds = time.perf_counter() - start
+
+    return BenchmarkResult(
+        match_count=match_count,
+        team_size=team_size,
+        per_match_seconds=per_match_seconds,
+        batched_seconds=batched_seconds,
+        max_deviation=float(np.abs(per_match - batched).max()),
+    )
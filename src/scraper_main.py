@@ -1,34 +1,78 @@
+import argparse
+from dataclasses import fields
+from datetime import date
 import logging
+import os
 import time
 
+from sqlalchemy import select
+
+from scraper.crawl_frontier import CrawlFrontier
 from scraper.db_populator import DbPopulator
+from scraper.extraction_cache import ExtractionCache
 from scraper.extractor import Extractor
 from scraper.file_handler import FileHandler
+from scraper.http_client import HttpClient
+from scraper.image_processor import ImageProcessor
+from scraper.player_enrichment import PlayerEnrichment
+from scraper.player_metadata_backfill import PlayerMetadataBackfill
+from scraper.rating_sweep import (
+    MatchStream,
+    RatingSweep,
+    SweepConfig,
+    parameter_grid,
+)
 from scraper.scraper import PlayerScraper, Scraper
 from scraper.scraping_manager import ScrapingManager
+from scraper.skill_calc_benchmark import run_benchmark
 from shared.config.settings import settings
 from shared.database.database import Database
 from shared.database.models import Player
 from shared.logging.logging import (
     extractor_logger,
     file_handler_logger,
+    player_scraper_logger,
     populator_logger,
     scraper_logger,
     scraping_manager_logger,
 )
 
 
-def run_scraper() -> None:
+def build_scraping_manager(http_client: HttpClient) -> ScrapingManager:
     file_handler = FileHandler(logger=file_handler_logger, settings=settings)
     database = Database.instance(settings=settings)
     extractor = Extractor(logger=extractor_logger, settings=settings)
+    extraction_cache = ExtractionCache(
+        logger=file_handler_logger,
+        cache_path=settings.EXTRACTION_CACHE_FILE,
+        fingerprint=Extractor.fingerprint(),
+    )
     scraper = Scraper(
-        logger=scraper_logger, file_handler=file_handler, extractor=extractor
+        logger=scraper_logger,
+        file_handler=file_handler,
+        extractor=extractor,
+        settings=settings,
+        http_client=http_client,
     )
     player_scraper = PlayerScraper(
         logger=scraper_logger,
         settings=settings,
         file_handler=file_handler,
+        http_client=http_client,
+    )
+    player_metadata_backfill = PlayerMetadataBackfill(
+        logger=populator_logger,
+        extractor=extractor,
+        file_handler=file_handler,
+        image_processor=ImageProcessor(logger=file_handler_logger, settings=settings),
+        database=database,
+    )
+    player_enrichment = PlayerEnrichment(
+        logger=player_scraper_logger,
+        settings=settings,
+        file_handler=file_handler,
+        player_scraper=player_scraper,
+        player_metadata_backfill=player_metadata_backfill,
     )
     db_populator = DbPopulator(
         logger=populator_logger,
@@ -36,17 +80,33 @@ def run_scraper() -> None:
         extractor=extractor,
         database=database,
         filehandler=file_handler,
+        player_metadata_backfill=player_metadata_backfill,
     )
     scraping_manager = ScrapingManager(
         logger=scraping_manager_logger,
         settings=settings,
         scraper=scraper,
         player_scraper=player_scraper,
+        player_enrichment=player_enrichment,
         extractor=extractor,
         db_populator=db_populator,
         database=database,
         file_handler=file_handler,
+        extraction_cache=extraction_cache,
+        crawl_frontier=CrawlFrontier(
+            logger=scraping_manager_logger,
+            frontier_path=settings.CRAWL_FRONTIER_FILE,
+        ),
     )
+    return scraping_manager
+
+
+def run_scraper() -> None:
+    with HttpClient(logger=scraper_logger, settings=settings) as http_client:
+        _run_scraper(build_scraping_manager(http_client=http_client))
+
+
+def _run_scraper(scraping_manager: ScrapingManager) -> None:
     # only use gunicorn.error logger for all logging
     LOGGER = logging.getLogger("gunicorn.debug")
     LOGGER.info("my info")
@@ -64,6 +124,9 @@ def run_scraper() -> None:
         scraper_logger.debug("Detailed debug message for scraper processing...")
         print("Re-Populating complete database with already cached data...")
         scraping_manager.populate_with_all_available_cached_data()
+    elif scraping_manager.db_populator.has_unfinished_batch():
+        print("Resuming the interrupted re-population...")
+        scraping_manager.populate_with_all_available_cached_data(resume=True)
     else:
         scraper_logger.debug("Detailed debug message for scraper processing...")
         print("Populating database with new data...")
@@ -86,5 +149,149 @@ def main() -> None:
         time.sleep(interval)
 
 
+def pack_cache(remove_loose: bool) -> None:
+    """Converts the loose HTML cache into the packed match report archive."""
+    file_handler = FileHandler(logger=file_handler_logger, settings=settings)
+    packed = file_handler.pack_cached_HTML(remove_loose=remove_loose)
+    print(f"{packed} pages packed into {settings.MATCH_REPORT_ARCHIVE_FILE}.")
+
+
+def check_parser_parity(parser: str) -> None:
+    """Compares the extraction results of `parser` with the built-in parser."""
+    with HttpClient(logger=scraper_logger, settings=settings) as http_client:
+        scraping_manager = build_scraping_manager(http_client=http_client)
+        mismatches = scraping_manager.verify_parser_parity(parser=parser)
+    print(f"{len(mismatches)} cached files with differing results.")
+    for file_path in mismatches:
+        print(file_path)
+
+
+def recompute(page_ids: list[int], since: date | None) -> None:
+    """Recomputes the ratings from the first match affected by a correction."""
+    with HttpClient(logger=scraper_logger, settings=settings) as http_client:
+        scraping_manager = build_scraping_manager(http_client=http_client)
+        scraping_manager.recompute(page_ids=page_ids, since=since)
+
+
+def benchmark_skill_calc(match_count: int) -> None:
+    """Compares the per-match TrueSkill updates with the batched kernel."""
+    for team_size in (1, 2):
+        result = run_benchmark(match_count=match_count, team_size=team_size)
+        print(
+            f"{result.match_count} matches, team size {result.team_size}: "
+            f"per match {result.per_match_seconds:.3f}s, "
+            f"batched {result.batched_seconds:.4f}s, "
+            f"speedup {result.speedup:.0f}x, "
+            f"max deviation {result.max_deviation:.1e}"
+        )
+
+
+def sweep_ratings(parameters: dict[str, list[float]], workers: int) -> None:
+    """Replays the match history under all parameter combinations."""
+    with HttpClient(logger=scraper_logger, settings=settings) as http_client:
+        scraping_manager = build_scraping_manager(http_client=http_client)
+        stream = MatchStream.from_reports(scraping_manager.load_all_match_reports())
+
+    rating_sweep = RatingSweep(logger=scraping_manager_logger, workers=workers)
+    results = rating_sweep.run(stream, parameter_grid(**parameters))
+    for result in sorted(results, key=lambda result: result.log_loss):
+        config = result.config
+        print(
+            f"log-loss {result.log_loss:.5f}, accuracy {result.accuracy:.4f}: "
+            f"mu={config.mu} sigma={config.sigma} beta={config.beta} "
+            f"tau={config.tau} draw={config.doubles_draw_probability}"
+        )
+
+
+def process_player_images() -> None:
+    """Re-resolves all players, creating the image variants of earlier downloads."""
+    file_handler = FileHandler(logger=file_handler_logger, settings=settings)
+    database = Database.instance(settings=settings)
+    player_metadata_backfill = PlayerMetadataBackfill(
+        logger=populator_logger,
+        extractor=Extractor(logger=extractor_logger, settings=settings),
+        file_handler=file_handler,
+        image_processor=ImageProcessor(logger=file_handler_logger, settings=settings),
+        database=database,
+    )
+    with database.get_sync_session() as session:
+        player_names = session.scalars(select(Player.name)).all()
+    player_metadata_backfill.enqueue(player_names)
+    player_metadata_backfill.join()
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="BTFV scraper")
+    subparsers = parser.add_subparsers(dest="command")
+    pack_parser = subparsers.add_parser(
+        "pack-cache", help="convert the cached HTML files into the packed archive"
+    )
+    pack_parser.add_argument(
+        "--remove-loose",
+        action="store_true",
+        help="delete the loose HTML files after packing them",
+    )
+    parity_parser = subparsers.add_parser(
+        "parser-parity",
+        help="compare extraction results of a parser backend over the cache",
+    )
+    parity_parser.add_argument("--parser", default="lxml")
+    recompute_parser = subparsers.add_parser(
+        "recompute",
+        help="replay the ratings from corrected match reports or a date on",
+    )
+    recompute_parser.add_argument(
+        "--page-id",
+        type=int,
+        action="append",
+        default=[],
+        help="page id of a corrected match report, can be repeated",
+    )
+    recompute_parser.add_argument(
+        "--since",
+        type=date.fromisoformat,
+        help="first match day to recompute (YYYY-MM-DD)",
+    )
+    benchmark_parser = subparsers.add_parser(
+        "benchmark-skill-calc",
+        help="time the batched TrueSkill kernel against the per-match updates",
+    )
+    benchmark_parser.add_argument("--matches", type=int, default=10_000)
+    sweep_parser = subparsers.add_parser(
+        "sweep-ratings",
+        help="replay the match history under a grid of rating parameters",
+    )
+    # one option per parameter, defaults to the production value
+    sweep_parameters = [field.name for field in fields(SweepConfig)]
+    for name in sweep_parameters:
+        sweep_parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            dest=name,
+            type=float,
+            nargs="+",
+            default=[getattr(SweepConfig(), name)],
+        )
+    sweep_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    subparsers.add_parser(
+        "process-player-images",
+        help="create the thumbnail and WebP variants of all downloaded images",
+    )
+    args = parser.parse_args()
+
+    if args.command == "pack-cache":
+        pack_cache(remove_loose=args.remove_loose)
+    elif args.command == "parser-parity":
+        check_parser_parity(parser=args.parser)
+    elif args.command == "recompute":
+        recompute(page_ids=args.page_id, since=args.since)
+    elif args.command == "benchmark-skill-calc":
+        benchmark_skill_calc(match_count=args.matches)
+    elif args.command == "sweep-ratings":
+        sweep_ratings(
+            parameters={name: getattr(args, name) for name in sweep_parameters},
+            workers=args.workers,
+        )
+    elif args.command == "process-player-images":
+        process_player_images()
+    else:
+        main()
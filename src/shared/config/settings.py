@@ -2,7 +2,7 @@ import os
 from pathlib import Path
 from urllib.parse import quote
 
-from pydantic import Field, model_validator
+from pydantic import Field, field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -35,12 +35,52 @@ class Settings(BaseSettings):
 
     # scraper
     SCRAPER_INTERVAL: int = Field(default=86400)
+    # concurrent crawling: 1 worker keeps the sequential crawl
+    SCRAPER_MAX_WORKERS: int = Field(default=1)
+    SCRAPER_MAX_REQUESTS_PER_HOST: int = Field(default=4)
+    # DTFB player enrichment: threads per stage, queue size between the stages
+    ENRICHMENT_SEARCH_WORKERS: int = Field(default=2)
+    ENRICHMENT_DETAIL_WORKERS: int = Field(default=2)
+    ENRICHMENT_IMAGE_WORKERS: int = Field(default=2)
+    ENRICHMENT_QUEUE_SIZE: int = Field(default=100)
+    # minimum seconds between the starts of two DTFB requests
+    ENRICHMENT_REQUEST_INTERVAL: float = Field(default=0.2)
+
+    # http client
+    HTTP_POOL_CONNECTIONS: int = Field(default=4)  # number of cached host pools
+    HTTP_POOL_MAXSIZE: int = Field(default=8)  # kept-alive connections per host
+    HTTP_CONNECT_TIMEOUT: float = Field(default=5.0)
+    HTTP_READ_TIMEOUT: float = Field(default=30.0)
+    HTTP_MAX_RETRIES: int = Field(default=3)
+    HTTP_BACKOFF_FACTOR: float = Field(default=0.5)
     MATCH_REPORT_HTML_PATH: Path = Field(
         default=Path.cwd() / "data" / "match_report_html"
     )
     ASSOCIATION_LOGOS_PATH: Path = Field(
         default=Path.cwd() / "data" / "association_logos"
     )
+    # store cached HTML gzip-compressed (`*.html.gz`), plain files stay readable
+    HTML_CACHE_COMPRESSION: bool = Field(default=False)
+    # append new match reports to a single compressed pack instead of loose files
+    HTML_CACHE_ARCHIVE: bool = Field(default=False)
+    MATCH_REPORT_ARCHIVE_FILE: Path = Field(
+        default=Path.cwd() / "data" / "match_report_html.pack"
+    )
+    # page id -> date, season and division of every cached match report
+    MATCH_REPORT_INDEX_FILE: Path = Field(
+        default=Path.cwd() / "data" / "match_report_index.jsonl"
+    )
+    # category, ids and image of enriched players, read by the match ingestion
+    PLAYER_METADATA_FILE: Path = Field(
+        default=Path.cwd() / "data" / "player_metadata.jsonl"
+    )
+    EXTRACTION_CACHE_FILE: Path = Field(
+        default=Path.cwd() / "data" / "extraction_cache.sqlite"
+    )
+    # status, content hash and links of every crawled page
+    CRAWL_FRONTIER_FILE: Path = Field(
+        default=Path.cwd() / "data" / "crawl_frontier.sqlite"
+    )
     PLAYER_HTML_PATH: Path = Field(default=Path.cwd() / "data" / "player_html")
     PLAYER_IMAGES_PATH: Path = Field(default=Path.cwd() / "data" / "player_images")
 
@@ -52,6 +92,16 @@ class Settings(BaseSettings):
         "player_name",
     ]
 
+    # processes parsing match reports during a full rebuild, 1 disables the pool
+    EXTRACTION_WORKERS: int = Field(default=os.cpu_count() or 1)
+    # match reports per transaction of batched population runs
+    DB_COMMIT_BATCH_SIZE: int = Field(default=100)
+    # ratings snapshot every n matches (0 disables), and always at season end
+    RATING_CHECKPOINT_INTERVAL: int = Field(default=5000)
+
+    # BeautifulSoup tree builder: "html.parser" (pure Python) or "lxml" (C-backed)
+    HTML_PARSER: str = Field(default="html.parser", validate_default=True)
+
     BTFV_URL_BASE: str = "https://btfv.de/sportdirector"
     DTFB_URL_BASE: str = "https://dtfb.de/wettbewerbe/turnierserie/spielersuche"
 
@@ -79,6 +129,14 @@ class Settings(BaseSettings):
 
     ASSETS_PATH: Path = Field(default=Path.cwd() / "data" / "assets")
 
+    @field_validator("HTML_PARSER")
+    @classmethod
+    def check_html_parser(cls, value: str) -> str:
+        """Accepts the BeautifulSoup tree builders the extractor supports."""
+        if value not in ("html.parser", "lxml"):
+            raise ValueError(f"Unknown HTML parser: {value}")
+        return value
+
     @model_validator(mode="after")  # type: ignore
     def build_sync_url(cls, values: "Settings") -> "Settings":
         """Post-processes the settings to build the database connection URLs.
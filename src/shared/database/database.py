@@ -57,6 +57,8 @@ class Database:
             self.init_db()
         else:
             print(f"Existing tables: {tables}")
+            # creates tables added since the database was initialized
+            BaseModel.metadata.create_all(self.sync_engine)
 
     def get_sync_session(self) -> Session:
         """Provide a transactional scope around a series of operations for sync."""
@@ -11,6 +11,7 @@ from sqlalchemy import (
     Identity,
     Index,
     Integer,
+    LargeBinary,
     String,
     UniqueConstraint,
     func,
@@ -399,3 +400,36 @@ class MatchParticipant(BaseModel):
     player: Mapped["Player"] = relationship(
         "Player", back_populates="matches", init=False
     )
+
+
+class PopulationProgress(BaseModel):
+    """Progress of a batched population run, updated with every commit."""
+
+    __tablename__ = "population_progress"
+
+    last_page_id: Mapped[int | None] = mapped_column(
+        Integer, nullable=True, default=None
+    )
+    report_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    completed: Mapped[bool] = mapped_column(
+        default=False, nullable=False, server_default="false"
+    )
+
+
+class RatingCheckpoint(BaseModel):
+    """Snapshot of the ratings of all players after a given match.
+
+    Replays and point-in-time rankings start from the nearest checkpoint
+    instead of scanning all match participants.
+    """
+
+    __tablename__ = "rating_checkpoints"
+
+    # the snapshot holds the ratings after this match
+    last_global_match_nr: Mapped[int] = mapped_column(
+        Integer, nullable=False, unique=True, index=True
+    )
+    date: Mapped[datetime] = mapped_column(Date, nullable=False, index=True)
+    player_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    # zlib-compressed player ids and ratings, see `RatingCheckpoints`
+    ratings: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
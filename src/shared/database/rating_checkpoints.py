@@ -0,0 +1,113 @@
+from collections.abc import Mapping, Sequence
+from datetime import date
+import struct
+from typing import cast
+import uuid
+import zlib
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from shared.database.models import Match, MatchParticipant, RatingCheckpoint
+
+# player id, mu and sigma of the combined, singles and doubles rating
+_RECORD = struct.Struct("<16s6d")
+
+Ratings = dict[uuid.UUID, tuple[float, ...]]
+
+
+class RatingCheckpoints:
+    """Reads and writes compact snapshots of all player ratings.
+
+    A checkpoint stores one fixed-size record per player as a single
+    zlib-compressed blob. Ratings at any point in time are the nearest earlier
+    checkpoint plus the last participation of every player after it.
+    """
+
+    @staticmethod
+    def pack(ratings: Mapping[uuid.UUID, Sequence[float]]) -> bytes:
+        return zlib.compress(
+            b"".join(
+                _RECORD.pack(player_id.bytes, *values)
+                for player_id, values in ratings.items()
+            )
+        )
+
+    @staticmethod
+    def unpack(blob: bytes) -> Ratings:
+        ratings: Ratings = {}
+        for player_id, *values in _RECORD.iter_unpack(zlib.decompress(blob)):
+            ratings[uuid.UUID(bytes=player_id)] = tuple(values)
+        return ratings
+
+    def create(
+        self,
+        last_global_match_nr: int,
+        match_date: date,
+        ratings: Mapping[uuid.UUID, Sequence[float]],
+    ) -> RatingCheckpoint:
+        return RatingCheckpoint(
+            last_global_match_nr=last_global_match_nr,
+            date=match_date,  # type: ignore[arg-type]
+            player_count=len(ratings),
+            ratings=self.pack(ratings),
+        )
+
+    def get_nearest(
+        self,
+        session: Session,
+        before_global_match_nr: int | None = None,
+        as_of: date | None = None,
+    ) -> RatingCheckpoint | None:
+        """Returns the latest checkpoint before a match or on a given date."""
+        query = select(RatingCheckpoint).order_by(
+            RatingCheckpoint.last_global_match_nr.desc()
+        )
+        if before_global_match_nr is not None:
+            query = query.where(
+                RatingCheckpoint.last_global_match_nr < before_global_match_nr
+            )
+        if as_of is not None:
+            query = query.where(RatingCheckpoint.date <= as_of)
+        return session.scalars(query.limit(1)).first()
+
+    def get_ratings(
+        self,
+        session: Session,
+        before_global_match_nr: int | None = None,
+        as_of: date | None = None,
+    ) -> Ratings:
+        """Returns the ratings of all players before a match or on a given date.
+
+        Players without a match until then are missing from the result.
+
+        Returns:
+            Mu and sigma of the combined, singles and doubles rating by player id.
+        """
+        checkpoint = self.get_nearest(session, before_global_match_nr, as_of)
+        ratings = self.unpack(checkpoint.ratings) if checkpoint else {}
+
+        # the after values carry all rating kinds, even if not played
+        query = (
+            select(
+                MatchParticipant.player_id,
+                MatchParticipant.mu_after_combined,
+                MatchParticipant.sigma_after_combined,
+                MatchParticipant.mu_after_singles,
+                MatchParticipant.sigma_after_singles,
+                MatchParticipant.mu_after_doubles,
+                MatchParticipant.sigma_after_doubles,
+            )
+            .join(Match, MatchParticipant.match_id == Match.id)
+            .distinct(MatchParticipant.player_id)
+            .order_by(MatchParticipant.player_id, Match.global_match_nr.desc())
+        )
+        if checkpoint is not None:
+            query = query.where(Match.global_match_nr > checkpoint.last_global_match_nr)
+        if before_global_match_nr is not None:
+            query = query.where(Match.global_match_nr < before_global_match_nr)
+        if as_of is not None:
+            query = query.where(Match.date <= as_of)
+        for player_id, *values in session.execute(query):
+            ratings[player_id] = cast(tuple[float, ...], tuple(values))
+        return ratings
@@ -0,0 +1,29 @@
+from pathlib import PurePath
+import re
+
+# variant name -> edge length in pixels of the square WebP image
+PLAYER_IMAGE_VARIANTS = {
+    # ranking and team tables, shown at 80px
+    "thumb": 160,
+    # player header, shown at 128px
+    "header": 256,
+}
+
+# processed images are named after their content hash, placeholders and
+# unprocessed downloads (8 digit player hash) never have variants
+_VARIANT_SET_NAME = re.compile(r"[0-9a-f]{16}\.jpg")
+
+
+def variant_set_name(content_hash: str) -> str:
+    """Returns the file name of the original of a processed image."""
+    return f"{content_hash[:16]}.jpg"
+
+
+def has_variants(image_file_name: str) -> bool:
+    """Tells from the name alone whether an image was processed into variants."""
+    return _VARIANT_SET_NAME.fullmatch(image_file_name) is not None
+
+
+def variant_file_name(image_file_name: str, variant: str) -> str:
+    """Returns the file name of a variant, e.g. `ab12.jpg` -> `ab12_thumb.webp`."""
+    return f"{PurePath(image_file_name).stem}_{variant}.webp"
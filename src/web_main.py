@@ -7,6 +7,7 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from shared.config.settings import settings
 from shared.database.database import Database
 from shared.logging.logging import scraper_logger, web_app_logger
+from shared.player_images import has_variants, variant_file_name
 from web_app.routes.faq import faq_bp
 from web_app.routes.home import home_bp
 from web_app.routes.player_matches import player_bp  # type: ignore
@@ -70,6 +71,13 @@ def create_app() -> Flask:
     def remove_session(e: BaseException | None = None) -> None:
         g.pop("db_session", None)
 
+    @app.template_filter("player_image")
+    def player_image(image_file_name: str, variant: str | None = None) -> str:
+        """Static path of a player image variant, the original if it has none."""
+        if variant is not None and has_variants(image_file_name):
+            return f"player_images/{variant_file_name(image_file_name, variant)}"
+        return f"player_images/{image_file_name}"
+
     @app.errorhandler(404)
     def page_not_found(
         e: BaseException | None = None,